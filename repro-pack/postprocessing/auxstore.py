@@ -0,0 +1,148 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Deduplicate the aux outputs of a run.
+
+With `output_aux_onlyonce = False`, GeoClaw rewrites topography and roughness
+in every fort.aXXXX, although most patches carry identical aux data from frame
+to frame. This tool hashes the aux block of every patch and keeps one copy per
+unique hash in `_output/aux_store`. framereader.open_frame resolves aux data
+from the store once the original fort.aXXXX files are removed.
+
+Example:
+
+    $ python auxstore.py ../../landspill-runs/utah_maya/_output --remove
+"""
+import os
+import hashlib
+import argparse
+import numpy
+from framereader import AUX_STORE_DIR, AUX_BLOCK_DTYPE, aux_refs_path, list_frames, read_frame_header
+
+
+def _digest(block, nx, ny):
+    """Hash the raw aux data of a patch together with its shape."""
+    return hashlib.blake2b(numpy.array([nx, ny]).tobytes()+block.tobytes(), digest_size=20).digest()
+
+
+def _block_counts(meta, patches):
+    """The number of float64 values in the aux block of each patch, ghost cells included."""
+    ng = meta["num_ghost"]
+    return meta["num_aux"] * (patches["nx"].astype(numpy.int64) + 2 * ng) * (patches["ny"].astype(numpy.int64) + 2 * ng)
+
+
+def _refs_resolve(output_dir, store_dir, frame, blocks, file_prefix="fort"):
+    """Check that the stored refs of a frame point to indexed blocks of the right sizes, one per patch."""
+
+    try:
+        refs = numpy.load(aux_refs_path(store_dir, frame, file_prefix))
+    except (OSError, ValueError):
+        return False
+
+    meta, patches = read_frame_header(output_dir, frame, file_prefix)
+    if refs.shape != (patches.size,) or numpy.any(refs < 0) or numpy.any(refs >= blocks.size):
+        return False
+
+    return bool(numpy.all(blocks["count"][refs] == _block_counts(meta, patches)))
+
+
+def build_aux_store(output_dir, remove=False, file_prefix="fort"):
+    """Move the aux data of all frames in an output directory into a deduplicated store.
+
+    Frames already in the store are skipped, so the store can be updated as a
+    run progresses; with remove, their fort.aXXXX files are still deleted once
+    the stored refs are checked against the index.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        remove: bool; delete each fort.aXXXX once its blocks are stored.
+        file_prefix: the prefix of output files.
+
+    Returns:
+    --------
+        nblocks: int; the number of aux blocks processed.
+        nunique: int; the number of new unique blocks added to the store.
+    """
+
+    store_dir = os.path.join(output_dir, AUX_STORE_DIR)
+    os.makedirs(store_dir, exist_ok=True)
+    index_path = os.path.join(store_dir, "blocks.npy")
+
+    blocks = numpy.load(index_path) if os.path.isfile(index_path) else numpy.zeros(0, AUX_BLOCK_DTYPE)
+    lookup = {digest: i for i, digest in enumerate(blocks["digest"])}
+    new_blocks = []
+    nblocks = 0
+
+    with open(os.path.join(store_dir, "blocks.bin"), "ab") as binfile:
+
+        # appended data start right after the blocks already indexed
+        end = int(blocks["start"][-1] + blocks["count"][-1]) if blocks.size else 0
+        binfile.truncate(end * 8)
+
+        for fno in list_frames(output_dir, file_prefix):
+            auxfile = os.path.join(output_dir, "{}.a{:04d}".format(file_prefix, fno))
+            if not os.path.isfile(auxfile):
+                continue
+
+            # stored by an earlier call (e.g., one without remove); only the removal may be left to do
+            if os.path.isfile(aux_refs_path(store_dir, fno, file_prefix)):
+                if remove and _refs_resolve(output_dir, store_dir, fno, blocks, file_prefix):
+                    os.remove(auxfile)
+                continue
+
+            meta, patches = read_frame_header(output_dir, fno, file_prefix)
+            data = numpy.fromfile(auxfile, dtype=numpy.float64)
+            refs = numpy.zeros(patches.size, dtype=numpy.int64)
+
+            start = 0
+            for i, (nx, ny, count) in enumerate(zip(patches["nx"], patches["ny"], _block_counts(meta, patches))):
+                count = int(count)
+                block = data[start:start+count]
+                digest = _digest(block, nx, ny)
+
+                if digest not in lookup:
+                    lookup[digest] = blocks.size + len(new_blocks)
+                    new_blocks.append((digest, end, count))
+                    binfile.write(block.tobytes())
+                    end += count
+
+                refs[i] = lookup[digest]
+                start += count
+
+            nblocks += patches.size
+
+            # the index must cover the new blocks before any refs point to them
+            binfile.flush()
+            numpy.save(index_path+".tmp.npy", numpy.concatenate(
+                (blocks, numpy.array(new_blocks, dtype=AUX_BLOCK_DTYPE))))
+            os.replace(index_path+".tmp.npy", index_path)
+            numpy.save(aux_refs_path(store_dir, fno, file_prefix), refs)
+
+            if remove:
+                os.remove(auxfile)
+
+    return nblocks, len(new_blocks)
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Deduplicate aux outputs of a GeoClaw run.")
+    parser.add_argument("output_dir", help="The _output directory of a run.")
+    parser.add_argument("--remove", action="store_true", help="Delete fort.aXXXX files once stored.")
+    parser.add_argument("--prefix", default="fort", help="Prefix of output files.")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(os.path.expanduser(args.output_dir))
+    nblocks, nunique = build_aux_store(output_dir, args.remove, args.prefix)
+    print("Stored {} aux block(s) from {}; {} new unique block(s)".format(nblocks, output_dir, nunique))
+
+
+if __name__ == "__main__":
+    main()
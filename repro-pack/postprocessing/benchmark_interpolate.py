@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Benchmark the interpolation engines of helpers.interpolate on a real frame.
+
+Requires the environment variable PYTHONPATH and CLAW to point to clawpack.
+
+Example (the defaults reproduce one panel of utah_flat.py):
+
+    $ python benchmark_interpolate.py --case utah_maya --frame 61
+"""
+import time
+import pathlib
+import argparse
+import numpy
+from clawpack import pyclaw
+from helpers import INTERP_METHODS, interpolate, get_max_AMR_level, clear_interp_cache
+
+# paths
+root_dir = pathlib.Path(__file__).expanduser().resolve().parents[2]
+runs_dir = root_dir.joinpath("landspill-runs")
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Benchmark interpolation engines.")
+    parser.add_argument("--case", default="utah_maya", help="Case name under landspill-runs.")
+    parser.add_argument("--frame", default=61, type=int, help="Frame number.")
+    parser.add_argument("--field", default=0, type=int, help="Index of the field to interpolate.")
+    parser.add_argument("--center", default=[-12459650., 4986000.], type=float, nargs=2, help="Center of target grid.")
+    parser.add_argument("--half-widths", default=[250., 130.], type=float, nargs=2, help="Half widths of target grid.")
+    parser.add_argument("--shape", default=[501, 211], type=int, nargs=2, help="Target grid size (nx, ny).")
+    parser.add_argument("--repeat", default=5, type=int, help="Number of cold and warm runs per engine.")
+    args = parser.parse_args()
+
+    output_dir = runs_dir.joinpath(args.case, "_output")
+    soln = pyclaw.Solution(args.frame, path=output_dir, file_format="binary", read_aux=False)
+    maxlv = get_max_AMR_level(soln)  # also builds the patch index, so it's not timed below
+
+    x = numpy.linspace(args.center[0]-args.half_widths[0], args.center[0]+args.half_widths[0], args.shape[0])
+    y = numpy.linspace(args.center[1]-args.half_widths[1], args.center[1]+args.half_widths[1], args.shape[1])
+
+    print("Case {}, frame {}, level {}, {} patches, target grid {}x{}".format(
+        args.case, args.frame, maxlv, len(soln.states), x.size, y.size))
+
+    # spline is the reference; cold runs start from an empty interpolation cache, so they time the engine
+    # itself, while warm runs reuse the target indices and weights cached by the previous run
+    results = {}
+    for method in reversed(INTERP_METHODS):
+        timings = {"cold": [], "warm": []}
+        for _ in range(args.repeat):
+            for kind in ("cold", "warm"):
+                if kind == "cold":
+                    clear_interp_cache()
+                tbg = time.perf_counter()
+                results[method] = interpolate(soln, args.field, x, y, maxlv, method=method)
+                timings[kind].append(time.perf_counter()-tbg)
+
+        print("{:>9s}: cold best {:.4e} s, mean {:.4e} s; warm best {:.4e} s, mean {:.4e} s; ".format(
+            method, min(timings["cold"]), numpy.mean(timings["cold"]),
+            min(timings["warm"]), numpy.mean(timings["warm"])
+        ) + "max |diff| vs spline {:.4e}".format(numpy.abs(results[method]-results["spline"]).max()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Wetted-footprint statistics computed on native AMR patches.
+
+A cell counts if its depth exceeds a threshold and no finer patch covers it, so
+every point of the domain contributes once, at the finest resolution
+available. Nothing is resampled onto a uniform grid.
+
+Example (footprint table of the flat-terrain Maya crude case):
+
+    $ python footprint.py ../../landspill-runs/utah_maya/_output \\
+        --center -12459650 4986000 --out maya-footprint.csv
+"""
+import os
+import argparse
+import concurrent.futures
+import numpy
+from framereader import list_frames, open_frame
+from helpers import get_patch_index
+from reductions import save_table
+
+# one row per frame; lengths in the units of the coordinates and times in seconds
+FOOTPRINT_DTYPE = numpy.dtype([
+    ("frame", numpy.int64), ("t", numpy.float64), ("ncells", numpy.int64), ("area", numpy.float64),
+    ("xmin", numpy.float64), ("ymin", numpy.float64), ("xmax", numpy.float64), ("ymax", numpy.float64),
+    ("xc", numpy.float64), ("yc", numpy.float64), ("max_dist", numpy.float64), ("front_speed", numpy.float64),
+])
+
+
+def finest_wet_cells(solution, tol=1e-3):
+    """Get the wet cells of a frame that no finer patch covers.
+
+    Args:
+    -----
+        solution: a framereader.Frame or a pyclaw.Solution.
+        tol: float; cells deeper than this are wet.
+
+    Returns:
+    --------
+        x, y: 1D numpy.ndarray; cell centers.
+        dx, dy: 1D numpy.ndarray; cell sizes.
+    """
+
+    index = get_patch_index(solution)
+    result = [numpy.zeros(0)] * 4
+
+    for pid, state in enumerate(index.states):
+        i, j = numpy.nonzero(state.q[0] > tol)
+        if not i.size:
+            continue
+
+        x = index.lower[pid, 0] + (i + 0.5) * index.delta[pid, 0]
+        y = index.lower[pid, 1] + (j + 0.5) * index.delta[pid, 1]
+
+        # drop cells covered by any finer level
+        for lv in index.levels[index.levels > index.level[pid]]:
+            bounds = index.lower[pid, 0], index.upper[pid, 0], index.lower[pid, 1], index.upper[pid, 1]
+            if index.query_box(*bounds, lv).size:
+                keep = index.locate(x, y, lv) < 0
+                x, y = x[keep], y[keep]
+
+        result = [
+            numpy.concatenate((old, new)) for old, new in
+            zip(result, [x, y, numpy.full(x.size, index.delta[pid, 0]), numpy.full(x.size, index.delta[pid, 1])])
+        ]
+
+    return tuple(result)
+
+
+def frame_footprint(output_dir, frame, center, tol=1e-3):
+    """Get the footprint statistics of one frame.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        frame: int; the frame number.
+        center: [x, y]; the rupture point distances are measured from.
+        tol: float; cells deeper than this are wet.
+
+    Returns:
+    --------
+        A structured numpy.ndarray of FOOTPRINT_DTYPE with one row. The
+        bounding box and the centroid are NaN for a dry frame, and the front
+        speed is left zero (see footprint_series).
+    """
+
+    soln = open_frame(output_dir, frame)
+    x, y, dx, dy = finest_wet_cells(soln, tol)
+    area = dx * dy
+
+    row = numpy.zeros(1, dtype=FOOTPRINT_DTYPE)
+    row["frame"] = frame
+    row["t"] = soln.t
+    row["ncells"] = x.size
+    row["area"] = area.sum()
+
+    if not x.size:
+        for name in ["xmin", "ymin", "xmax", "ymax", "xc", "yc"]:
+            row[name] = numpy.nan
+        return row
+
+    row["xmin"], row["xmax"] = (x - dx / 2.).min(), (x + dx / 2.).max()
+    row["ymin"], row["ymax"] = (y - dy / 2.).min(), (y + dy / 2.).max()
+    row["xc"], row["yc"] = (x * area).sum() / row["area"], (y * area).sum() / row["area"]
+    row["max_dist"] = numpy.hypot(x - center[0], y - center[1]).max()
+
+    return row
+
+
+def front_speed(table):
+    """Fill the front_speed column of a footprint table with d(max_dist)/dt.
+
+    Central differences inside, one-sided differences at the two ends.
+    """
+
+    if table.size > 1:
+        table["front_speed"] = numpy.gradient(table["max_dist"], table["t"])
+    return table
+
+
+def footprint_series(output_dir, center, frames=None, tol=1e-3, nprocs=None):
+    """Get the footprint statistics of all frames of a run.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        center: [x, y]; the rupture point distances are measured from.
+        frames: an iterable of frame numbers; None means all frames.
+        tol: float; cells deeper than this are wet.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+
+    Returns:
+    --------
+        A structured numpy.ndarray of FOOTPRINT_DTYPE sorted by frame.
+    """
+
+    frames = list_frames(output_dir) if frames is None else sorted(frames)
+
+    with concurrent.futures.ProcessPoolExecutor(nprocs) as executor:
+        rows = list(executor.map(
+            frame_footprint, [output_dir]*len(frames), frames, [center]*len(frames), [tol]*len(frames),
+            chunksize=max(1, len(frames)//(4*(nprocs or os.cpu_count() or 1)))
+        ))
+
+    return front_speed(numpy.concatenate([numpy.zeros(0, dtype=FOOTPRINT_DTYPE)] + rows))
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Wetted-footprint statistics of all frames of a run.")
+    parser.add_argument("output_dir", help="The _output directory of a run.")
+    parser.add_argument("--center", required=True, type=float, nargs=2, help="x and y of the rupture point.")
+    parser.add_argument("--tol", default=1e-3, type=float, help="Depth threshold of wet cells.")
+    parser.add_argument("--nprocs", default=None, type=int, help="Number of worker processes.")
+    parser.add_argument("--out", default=None, help="Output CSV (default: <output_dir>/footprint.csv).")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(os.path.expanduser(args.output_dir))
+    table = footprint_series(output_dir, args.center, tol=args.tol, nprocs=args.nprocs)
+    save_table(args.out or os.path.join(output_dir, "footprint.csv"), table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Differences between the frames of two runs of the same case.
+
+Frames with the same number in two _output directories are sampled onto a
+common uniform grid as fine as the finest cells of either run, and the L1, L2,
+and Linf norms of the differences of depth and momentum are reduced per frame
+on a process pool. Only the norms (and, optionally, difference rasters) leave
+the workers.
+
+Example (regression check of the landspill solver against GeoClaw):
+
+    $ python framediff.py ../runs/malpasset-dam-break-geoclaw/_output \\
+        ../runs/malpasset-dam-break-landspill/_output --out malpasset-diff.csv
+"""
+import os
+import argparse
+import concurrent.futures
+import numpy
+from framereader import list_frames, open_frame, read_frame_header
+from helpers import interpolate
+from rasters import write_geotiff
+from reductions import save_table
+
+# compared fields and their indices in q
+DIFF_FIELDS = {"depth": 0, "hu": 1, "hv": 2}
+
+# one row per frame; norms are area-weighted, i.e., integrals over the common grid
+DIFF_DTYPE = numpy.dtype(
+    [("frame", numpy.int64), ("t_a", numpy.float64), ("t_b", numpy.float64)] +
+    [("{}_{}".format(norm, name), numpy.float64) for name in DIFF_FIELDS for norm in ["l1", "l2", "linf"]]
+)
+
+
+def common_grid(output_a, output_b, frames, delta=None, bbox=None):
+    """Get a uniform grid covering the overlap of two runs.
+
+    Args:
+    -----
+        output_a, output_b: path-like objects; the _output directories.
+        frames: a list of frame numbers whose headers set the cell size.
+        delta: None or [dx, dy]; None means the finest cell size of either run.
+        bbox: None or [xmin, ymin, xmax, ymax]; None means the overlap of the
+            two domains.
+
+    Returns:
+    --------
+        x, y: 1D numpy.ndarray; cell centers.
+    """
+
+    lower, upper, finest = [], [], []
+    for output_dir in (output_a, output_b):
+        for fno in frames:
+            patches = read_frame_header(output_dir, fno)[1]
+            coarse = patches[patches["level"] == 1]
+            lower.append([coarse["xlow"].min(), coarse["ylow"].min()])
+            upper.append([
+                (coarse["xlow"] + coarse["nx"] * coarse["dx"]).max(),
+                (coarse["ylow"] + coarse["ny"] * coarse["dy"]).max()
+            ])
+            finest.append([patches["dx"].min(), patches["dy"].min()])
+
+    lower, upper = numpy.max(lower, axis=0), numpy.min(upper, axis=0)
+    lower, upper = (lower, upper) if bbox is None else (numpy.array(bbox[:2]), numpy.array(bbox[2:]))
+    delta = numpy.min(finest, axis=0) if delta is None else numpy.asarray(delta, dtype=numpy.float64)
+
+    nx, ny = numpy.maximum(numpy.round((upper - lower) / delta).astype(numpy.int64), 1)
+    return lower[0] + (numpy.arange(nx) + 0.5) * delta[0], lower[1] + (numpy.arange(ny) + 0.5) * delta[1]
+
+
+def frame_diff(output_a, output_b, frame, x, y, method="nearest", raster_dir=None):
+    """Get the difference norms of one frame.
+
+    Args:
+    -----
+        output_a, output_b: path-like objects; the _output directories.
+        frame: int; the frame number.
+        x, y: 1D numpy.ndarray; cell centers of the common grid.
+        method: the interpolation engine; see helpers.interpolate.
+        raster_dir: None, or a folder to write the differences (a minus b) to
+            `diff-frameXXXX.tif`, one band per field.
+
+    Returns:
+    --------
+        A structured numpy.ndarray of DIFF_DTYPE with one row.
+    """
+    # pylint: disable=too-many-arguments
+
+    bbox = [x.min(), y.min(), x.max(), y.max()]
+    fields = list(DIFF_FIELDS.values())
+    soln_a, soln_b = open_frame(output_a, frame, bbox=bbox), open_frame(output_b, frame, bbox=bbox)
+    diff = interpolate(soln_a, fields, x, y, None, method) - interpolate(soln_b, fields, x, y, None, method)
+
+    area = (x[1] - x[0] if x.size > 1 else 1.) * (y[1] - y[0] if y.size > 1 else 1.)
+    absdiff = numpy.abs(diff).reshape(len(fields), -1)
+
+    row = numpy.zeros(1, dtype=DIFF_DTYPE)
+    row["frame"], row["t_a"], row["t_b"] = frame, soln_a.t, soln_b.t
+    for i, name in enumerate(DIFF_FIELDS):
+        row["l1_"+name] = absdiff[i].sum() * area
+        row["l2_"+name] = numpy.sqrt((absdiff[i]**2).sum() * area)
+        row["linf_"+name] = absdiff[i].max()
+
+    if raster_dir is not None:
+        write_geotiff(os.path.join(raster_dir, "diff-frame{:04d}.tif".format(frame)), diff, x, y)
+
+    return row
+
+
+def diff_runs(output_a, output_b, frames=None, delta=None, bbox=None, method="nearest", raster_dir=None, nprocs=None):
+    """Get the difference norms of all frames two runs have in common.
+
+    Args:
+    -----
+        output_a, output_b: path-like objects; the _output directories.
+        frames: an iterable of frame numbers; None means all common frames.
+        delta, bbox: the common grid; see common_grid.
+        method: the interpolation engine; see helpers.interpolate.
+        raster_dir: None, or a folder for difference rasters; see frame_diff.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+
+    Returns:
+    --------
+        A structured numpy.ndarray of DIFF_DTYPE sorted by frame.
+    """
+    # pylint: disable=too-many-arguments
+
+    common = sorted(set(list_frames(output_a)) & set(list_frames(output_b)))
+    frames = common if frames is None else sorted(set(frames) & set(common))
+    x, y = common_grid(output_a, output_b, frames, delta, bbox)
+
+    if raster_dir is not None:
+        os.makedirs(raster_dir, exist_ok=True)
+
+    nframes = len(frames)
+    with concurrent.futures.ProcessPoolExecutor(nprocs) as executor:
+        rows = list(executor.map(
+            frame_diff, [output_a]*nframes, [output_b]*nframes, frames, [x]*nframes, [y]*nframes,
+            [method]*nframes, [raster_dir]*nframes
+        ))
+
+    return numpy.concatenate([numpy.zeros(0, dtype=DIFF_DTYPE)] + rows)
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Frame-by-frame differences between two GeoClaw runs.")
+    parser.add_argument("output_a", help="The _output directory of the first run.")
+    parser.add_argument("output_b", help="The _output directory of the second run.")
+    parser.add_argument("--frames", default=None, type=int, nargs="+", help="Frame numbers (default: all common).")
+    parser.add_argument("--delta", default=None, type=float, nargs=2, help="Cell size of the common grid.")
+    parser.add_argument("--bbox", default=None, type=float, nargs=4, help="xmin ymin xmax ymax of the common grid.")
+    parser.add_argument("--method", default="nearest", help="Interpolation engine.")
+    parser.add_argument("--rasters", default=None, help="Folder for difference GeoTIFFs (default: none).")
+    parser.add_argument("--nprocs", default=None, type=int, help="Number of worker processes.")
+    parser.add_argument("--out", default="frame-diff.csv", help="Output CSV.")
+    args = parser.parse_args()
+
+    table = diff_runs(
+        os.path.abspath(os.path.expanduser(args.output_a)), os.path.abspath(os.path.expanduser(args.output_b)),
+        args.frames, args.delta, args.bbox, args.method, args.rasters, args.nprocs
+    )
+    save_table(args.out, table)
+
+    for row in table:
+        print("frame {}: linf depth {:.6e}, hu {:.6e}, hv {:.6e}".format(
+            row["frame"], row["linf_depth"], row["linf_hu"], row["linf_hv"]))
+
+
+if __name__ == "__main__":
+    main()
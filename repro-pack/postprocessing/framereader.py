@@ -0,0 +1,378 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Fast reader of GeoClaw binary frame outputs.
+
+Instead of building a pyclaw.Solution, which copies every patch into its own
+State object, a frame is opened by parsing the headers into a compact
+structured array and memory-mapping `fort.bXXXX`. Patches are zero-copy NumPy
+views into the mapped file, so only the pages actually sampled are read from
+disk. Patches can also be pruned by a bounding box and a level range before any
+data are touched.
+
+The returned Frame mimics the parts of pyclaw.Solution used by `helpers.py`
+(`t`, `states`, `state.patch`, `state.q`, `state.aux`), so the helpers accept a
+Frame in place of a Solution.
+"""
+import os
+import numpy
+
+# the per-patch header table; offsets are in bytes from the start of fort.bXXXX
+PATCH_DTYPE = numpy.dtype([
+    ("id", numpy.int32), ("level", numpy.int32), ("nx", numpy.int32), ("ny", numpy.int32),
+    ("xlow", numpy.float64), ("ylow", numpy.float64), ("dx", numpy.float64), ("dy", numpy.float64),
+    ("offset", numpy.int64),
+])
+
+# deduplicated aux storage (see auxstore.py): unique blocks concatenated in blocks.bin, their
+# digests and locations (in float64 items) in blocks.npy, and per-frame block IDs in refs files
+AUX_STORE_DIR = "aux_store"
+AUX_BLOCK_DTYPE = numpy.dtype([("digest", "S20"), ("start", numpy.int64), ("count", numpy.int64)])
+
+
+class PatchView:
+    """The geometry of one patch, with the attribute names of pyclaw.geometry.Patch."""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, record):
+        self.patch_index = int(record["id"])
+        self.level = int(record["level"])
+        self.num_cells_global = [int(record["nx"]), int(record["ny"])]
+        self.delta = [float(record["dx"]), float(record["dy"])]
+        self.lower_global = [float(record["xlow"]), float(record["ylow"])]
+        self.upper_global = [
+            self.lower_global[0] + self.num_cells_global[0] * self.delta[0],
+            self.lower_global[1] + self.num_cells_global[1] * self.delta[1],
+        ]
+        self.num_dim = 2
+
+
+class StateView:
+    """The data of one patch, with the attribute names of pyclaw.State.
+
+    `q` and `aux` have shapes (num_eqn, nx, ny) and (num_aux, nx, ny), without
+    ghost cells, and are views into the mapped files.
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, patch, q, aux, t):
+        self.patch = patch
+        self.q = q
+        self.aux = aux
+        self.t = t
+
+
+class Frame:
+    """A frame of GeoClaw binary output.
+
+    Args:
+    -----
+        t: float; the simulation time of this frame.
+        num_eqn, num_aux, num_ghost: ints; from fort.tXXXX.
+        patches: a structured numpy.ndarray of PATCH_DTYPE.
+        qblocks: a list of 1D float64 arrays; the raw data (with ghost cells) of
+            each patch in fort.bXXXX, usually slices of a numpy.memmap.
+        auxblocks: a list of 1D float64 arrays from fort.aXXXX, or None.
+
+    Attributes:
+    -----------
+        t, num_eqn, num_aux, num_ghost, patches: same as the arguments.
+        states: a list of StateView, one per row of `patches`.
+    """
+
+    def __init__(self, t, num_eqn, num_aux, num_ghost, patches, qblocks, auxblocks=None):
+        self.t = t
+        self.num_eqn = num_eqn
+        self.num_aux = num_aux
+        self.num_ghost = num_ghost
+        self.patches = patches
+        self.states = [
+            StateView(
+                PatchView(record), self._patch_view(qblocks[i], record, num_eqn),
+                None if auxblocks is None else self._patch_view(auxblocks[i], record, num_aux), t
+            )
+            for i, record in enumerate(patches)
+        ]
+
+    def _patch_view(self, block, record, nvars):
+        """Get the zero-copy view of one patch, without ghost cells, from its raw data."""
+
+        ng = self.num_ghost
+        nx, ny = int(record["nx"]), int(record["ny"])
+
+        # Fortran writes q(1:nvars, 1-ng:nx+ng, 1-ng:ny+ng) in column-major order
+        block = block.reshape((nvars, nx+2*ng, ny+2*ng), order="F")
+        return block[:, ng:ng+nx, ng:ng+ny]
+
+
+def _first_tokens(filepath):
+    """Get the first token of every non-empty line in a text file."""
+
+    with open(filepath, "r") as fileobj:
+        return [line.split(None, 1)[0] for line in fileobj if line.strip()]
+
+
+def list_frames(output_dir, file_prefix="fort"):
+    """Get the sorted frame numbers available in an output directory.
+
+    A frame counts once its fort.tXXXX exists; GeoClaw writes it last.
+    """
+
+    frames = []
+    for name in os.listdir(output_dir):
+        if name.startswith(file_prefix+".t") and name[len(file_prefix)+2:].isdigit():
+            frames.append(int(name[len(file_prefix)+2:]))
+
+    return sorted(frames)
+
+
+def frame_times(output_dir, frames=None, file_prefix="fort"):
+    """Get the times of frames (all frames if None) from their fort.tXXXX files."""
+
+    frames = list_frames(output_dir, file_prefix) if frames is None else frames
+    return numpy.array([
+        float(_first_tokens(os.path.join(output_dir, "{}.t{:04d}".format(file_prefix, fno)))[0].replace("D", "E"))
+        for fno in frames
+    ], dtype=numpy.float64)
+
+
+def sidecar_path(output_dir, frame, file_prefix="fort"):
+    """Get the path to the header sidecar of a frame."""
+    return os.path.join(output_dir, "{}.q{:04d}.idx.npz".format(file_prefix, frame))
+
+
+def _source_stats(output_dir, frame, file_prefix="fort"):
+    """Get (mtime in ns, size) of fort.tXXXX, fort.qXXXX, and fort.bXXXX; -1 if missing."""
+
+    stats = numpy.full((3, 2), -1, dtype=numpy.int64)
+    for i, kind in enumerate("tqb"):
+        try:
+            stat = os.stat(os.path.join(output_dir, "{}.{}{:04d}".format(file_prefix, kind, frame)))
+        except FileNotFoundError:
+            continue
+        stats[i] = stat.st_mtime_ns, stat.st_size
+
+    return stats
+
+
+def write_sidecar(output_dir, frame, file_prefix="fort"):
+    """Parse the ASCII headers of a frame and save them in a binary sidecar.
+
+    The sidecar holds the patch table (ID, level, cell counts, bounds, cell
+    sizes, and byte offsets into fort.bXXXX), the frame metadata, and the mtimes
+    and sizes of the source files for detecting stale sidecars.
+
+    Returns:
+    --------
+        The path to the sidecar.
+    """
+
+    stats = _source_stats(output_dir, frame, file_prefix)
+    meta, patches = read_frame_header(output_dir, frame, file_prefix, use_sidecar=False)
+    filepath = sidecar_path(output_dir, frame, file_prefix)
+
+    # write to a temporary file first so readers never see a partial sidecar
+    with open(filepath+".tmp", "wb") as fileobj:
+        numpy.savez(
+            fileobj, patches=patches, stats=stats, t=meta["t"],
+            sizes=numpy.array([meta["num_eqn"], meta["num_aux"], meta["num_ghost"]])
+        )
+    os.replace(filepath+".tmp", filepath)
+
+    return filepath
+
+
+def read_sidecar(output_dir, frame, file_prefix="fort"):
+    """Read the header sidecar of a frame.
+
+    Returns:
+    --------
+        (meta, patches) as read_frame_header returns, or None if the sidecar
+        does not exist or is stale (i.e., the source files' mtimes or sizes
+        have changed since it was written).
+    """
+
+    try:
+        with numpy.load(sidecar_path(output_dir, frame, file_prefix)) as data:
+            if not numpy.array_equal(data["stats"], _source_stats(output_dir, frame, file_prefix)):
+                return None
+            sizes = data["sizes"]
+            meta = {
+                "t": float(data["t"]), "num_eqn": int(sizes[0]),
+                "num_aux": int(sizes[1]), "num_ghost": int(sizes[2])
+            }
+            return meta, data["patches"]
+    except (FileNotFoundError, KeyError, ValueError, OSError):
+        return None
+
+
+def read_frame_header(output_dir, frame, file_prefix="fort", use_sidecar=True):
+    """Read the time, sizes, and patch header table of a frame.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        frame: int; the frame number.
+        file_prefix: the prefix of output files.
+        use_sidecar: bool; use a fresh sidecar from write_sidecar if there is
+            one, instead of parsing the ASCII headers.
+
+    Returns:
+    --------
+        meta: a dictionary with keys t, num_eqn, num_aux, num_ghost.
+        patches: a structured numpy.ndarray of PATCH_DTYPE.
+    """
+
+    if use_sidecar:
+        header = read_sidecar(output_dir, frame, file_prefix)
+        if header is not None:
+            return header
+
+    tokens = _first_tokens(os.path.join(output_dir, "{}.t{:04d}".format(file_prefix, frame)))
+    meta = {
+        "t": float(tokens[0].replace("D", "E")), "num_eqn": int(tokens[1]),
+        "num_aux": int(tokens[3]), "num_ghost": int(tokens[5])
+    }
+    npatches, num_dim = int(tokens[2]), int(tokens[4])
+
+    if num_dim != 2:
+        raise NotImplementedError("Only 2D outputs are supported, got {}D".format(num_dim))
+
+    # each patch header has 8 lines: id, level, mx, my, xlow, ylow, dx, dy
+    tokens = _first_tokens(os.path.join(output_dir, "{}.q{:04d}".format(file_prefix, frame)))
+    tokens = numpy.array(tokens[:8*npatches]).reshape(npatches, 8)
+
+    patches = numpy.zeros(npatches, dtype=PATCH_DTYPE)
+    for col, name in enumerate(["id", "level", "nx", "ny"]):
+        patches[name] = tokens[:, col].astype(numpy.int64)
+    for col, name in enumerate(["xlow", "ylow", "dx", "dy"], 4):
+        patches[name] = numpy.char.replace(tokens[:, col], "D", "E").astype(numpy.float64)
+
+    ng = meta["num_ghost"]
+    nbytes = meta["num_eqn"] * (patches["nx"] + 2 * ng) * (patches["ny"] + 2 * ng) * 8
+    patches["offset"][1:] = numpy.cumsum(nbytes)[:-1]
+
+    return meta, patches
+
+
+def select_patches(patches, bbox=None, levels=None):
+    """Keep only the patches intersecting a bounding box and within a level range.
+
+    Args:
+    -----
+        patches: a structured numpy.ndarray of PATCH_DTYPE.
+        bbox: None or [xmin, ymin, xmax, ymax].
+        levels: None or (min level, max level), both inclusive.
+
+    Returns:
+    --------
+        A structured numpy.ndarray of PATCH_DTYPE; the offsets are untouched.
+    """
+
+    keep = numpy.ones(patches.size, dtype=bool)
+
+    if levels is not None:
+        keep &= (patches["level"] >= levels[0]) & (patches["level"] <= levels[1])
+
+    if bbox is not None:
+        keep &= (patches["xlow"] <= bbox[2]) & (patches["xlow"] + patches["nx"] * patches["dx"] >= bbox[0])
+        keep &= (patches["ylow"] <= bbox[3]) & (patches["ylow"] + patches["ny"] * patches["dy"] >= bbox[1])
+
+    return patches[keep]
+
+
+def _block_ranges(patches, nvars, num_eqn, num_ghost):
+    """Get the starting item and the number of items of each patch in a binary file."""
+
+    # offsets are w.r.t. fort.bXXXX; aux files have the same layout but with nvars fields
+    starts = patches["offset"] // (8 * num_eqn) * nvars
+    counts = nvars * (patches["nx"].astype(numpy.int64) + 2 * num_ghost) * (patches["ny"] + 2 * num_ghost)
+    return starts, counts
+
+
+def _load_blocks(filepath, starts, counts, mmap):
+    """Get the raw data of patches from a binary file, either mapped or read into memory."""
+
+    if mmap:
+        data = numpy.memmap(filepath, dtype=numpy.float64, mode="r")
+        return [data[start:start+count] for start, count in zip(starts, counts)]
+
+    # read only the requested patches, in file order
+    blocks = [None] * starts.size
+    with open(filepath, "rb") as fileobj:
+        for i in numpy.argsort(starts, kind="stable"):
+            fileobj.seek(int(starts[i]) * 8)
+            blocks[i] = numpy.fromfile(fileobj, dtype=numpy.float64, count=int(counts[i]))
+
+    return blocks
+
+
+def aux_refs_path(store_dir, frame, file_prefix="fort"):
+    """Get the path to the file of a frame's aux block IDs in an aux store."""
+    return os.path.join(store_dir, "{}.a{:04d}.refs.npy".format(file_prefix, frame))
+
+
+def _load_stored_aux_blocks(store_dir, frame, positions, mmap, file_prefix="fort"):
+    """Get the aux data of patches (by their positions in fort.qXXXX) from an aux store.
+
+    Returns None if the store does not have this frame.
+    """
+
+    try:
+        refs = numpy.load(aux_refs_path(store_dir, frame, file_prefix))
+        blocks = numpy.load(os.path.join(store_dir, "blocks.npy"))[refs[positions]]
+    except FileNotFoundError:
+        return None
+
+    return _load_blocks(os.path.join(store_dir, "blocks.bin"), blocks["start"], blocks["count"], mmap)
+
+
+def open_frame(output_dir, frame, read_aux=False, bbox=None, levels=None, mmap=True, file_prefix="fort"):
+    """Open a frame of binary output.
+
+    The patch header table is read first. Then only the patches intersecting
+    `bbox` and within `levels` are loaded; the data of other patches are never
+    touched.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        frame: int; the frame number.
+        read_aux: bool; whether to also load aux data, from fort.aXXXX or, if
+            it has been removed, from the deduplicated aux store (see
+            auxstore.py); ignored if neither exists.
+        bbox: None or [xmin, ymin, xmax, ymax]; only load patches intersecting it.
+        levels: None or (min level, max level); only load patches in this range.
+        mmap: bool; if True, patches are views into memory-mapped files, and only
+            the pages actually sampled are read. If False, the selected patches
+            are read into memory right away (e.g., to prefetch frames).
+        file_prefix: the prefix of output files.
+
+    Returns:
+    --------
+        A Frame.
+    """
+
+    meta, allpatches = read_frame_header(output_dir, frame, file_prefix)
+    patches = select_patches(allpatches, bbox, levels)
+
+    starts, counts = _block_ranges(patches, meta["num_eqn"], meta["num_eqn"], meta["num_ghost"])
+    qblocks = _load_blocks(
+        os.path.join(output_dir, "{}.b{:04d}".format(file_prefix, frame)), starts, counts, mmap)
+
+    auxblocks = None
+    auxfile = os.path.join(output_dir, "{}.a{:04d}".format(file_prefix, frame))
+    if read_aux and meta["num_aux"] > 0 and os.path.isfile(auxfile):
+        starts, counts = _block_ranges(patches, meta["num_aux"], meta["num_eqn"], meta["num_ghost"])
+        auxblocks = _load_blocks(auxfile, starts, counts, mmap)
+    elif read_aux and meta["num_aux"] > 0:
+        positions = numpy.searchsorted(allpatches["offset"], patches["offset"])
+        auxblocks = _load_stored_aux_blocks(
+            os.path.join(output_dir, AUX_STORE_DIR), frame, positions, mmap, file_prefix)
+
+    return Frame(meta["t"], meta["num_eqn"], meta["num_aux"], meta["num_ghost"], patches, qblocks, auxblocks)
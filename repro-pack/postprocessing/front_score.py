@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Score simulated oil fronts of the inclined-plane case against Lister (1992).
+
+For every experimental time, the frame closest in time is contoured on native
+AMR patches (see contours.py), and the distances from all experimental front
+points to the simulated front come from one query on a cKDTree of the
+densified front. Many runs (e.g., different resolutions or friction types) are
+scored in one call, in parallel.
+
+Example (writes one row per run per experimental time):
+
+    $ python front_score.py ../runs/silicone-oil-inclined-plane \\
+        ../../sensitivity-runs/inclined-plane-* --out front-scores.csv
+"""
+import os
+import glob
+import pathlib
+import argparse
+import concurrent.futures
+import numpy
+from scipy.spatial import cKDTree
+from contours import frame_contours
+from framereader import frame_times, list_frames
+from reductions import save_table
+
+# validation data
+lister_dir = pathlib.Path(__file__).expanduser().resolve().parents[1].joinpath(
+    "runs", "silicone-oil-inclined-plane", "lister_1992")
+
+# one row per run per experimental time; distances in meters
+SCORE_DTYPE = numpy.dtype([
+    ("run", "U256"), ("frame", numpy.int64), ("t", numpy.float64), ("t_exp", numpy.float64),
+    ("npoints", numpy.int64), ("mean_dist", numpy.float64), ("max_dist", numpy.float64),
+])
+
+
+def load_lister(data_dir=lister_dir):
+    """Load the experimental fronts.
+
+    Returns:
+    --------
+        A dictionary; {time: 2D numpy.ndarray of shape (npoints, 2)}, sorted by time.
+    """
+
+    data = {}
+    for filepath in glob.glob(os.path.join(data_dir, "T=*.csv")):
+        time = float(os.path.basename(filepath)[2:-4])
+        data[time] = numpy.loadtxt(filepath, delimiter=",", skiprows=1, ndmin=2)
+
+    return dict(sorted(data.items()))
+
+
+def densify(polylines, spacing):
+    """Get the points of polylines with extra points so consecutive points are at most `spacing` apart."""
+
+    points = []
+    for line in polylines:
+        lengths = numpy.hypot(*numpy.diff(line, axis=0).T)
+        nsub = numpy.maximum(numpy.ceil(lengths / spacing).astype(numpy.int64), 1)
+        frac = numpy.concatenate([numpy.arange(n) / n for n in nsub])
+        seg = numpy.repeat(numpy.arange(lengths.size), nsub)
+        points.append(line[seg] + frac[:, None] * (line[seg+1] - line[seg]))
+        points.append(line[-1:])
+
+    return numpy.concatenate(points) if points else numpy.zeros((0, 2))
+
+
+def score_front(polylines, points, spacing):
+    """Get the mean and max distances from points to a front.
+
+    Args:
+    -----
+        polylines: a list of 2D numpy.ndarray of shape (n, 2); the front.
+        points: 2D numpy.ndarray of shape (npoints, 2); e.g., experimental data.
+        spacing: float; the front is densified to this spacing, which bounds
+            the error of the distances.
+
+    Returns:
+    --------
+        mean, max: floats; NaN if the front is empty.
+    """
+
+    front = densify(polylines, spacing)
+    if not front.shape[0]:
+        return numpy.nan, numpy.nan
+
+    dists, _ = cKDTree(front).query(points)
+    return dists.mean(), dists.max()
+
+
+def _score_one(output_dir, frame, t_exp, points, threshold, spacing):
+    """Score the front of one frame against one set of experimental points."""
+
+    t, polylines = frame_contours(output_dir, frame, threshold)
+    mean, vmax = score_front(polylines, points, spacing)
+
+    row = numpy.zeros(1, dtype=SCORE_DTYPE)
+    row["run"], row["frame"], row["t"], row["t_exp"] = str(output_dir), frame, t, t_exp
+    row["npoints"], row["mean_dist"], row["max_dist"] = points.shape[0], mean, vmax
+    return row
+
+
+def score_runs(output_dirs, data=None, threshold=1e-3, spacing=1e-4, nprocs=None):
+    """Score the fronts of runs against experimental fronts.
+
+    Args:
+    -----
+        output_dirs: a list of the _output directories of runs.
+        data: a dictionary from load_lister; None means the Lister (1992) data.
+        threshold: float; the depth contour taken as the front.
+        spacing: float; the spacing of the densified front.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+
+    Returns:
+    --------
+        A structured numpy.ndarray of SCORE_DTYPE, ordered by run and time.
+    """
+
+    data = load_lister() if data is None else data
+
+    with concurrent.futures.ProcessPoolExecutor(nprocs) as executor:
+        futures = []
+        for output_dir in output_dirs:
+            frames = list_frames(output_dir)
+            times = frame_times(output_dir, frames)
+            for t_exp, points in data.items():
+                frame = frames[numpy.argmin(numpy.abs(times - t_exp))]
+                futures.append(executor.submit(_score_one, output_dir, frame, t_exp, points, threshold, spacing))
+
+        rows = [future.result() for future in futures]
+
+    return numpy.concatenate([numpy.zeros(0, dtype=SCORE_DTYPE)] + rows)
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Score inclined-plane fronts against Lister (1992).")
+    parser.add_argument("runs", nargs="+", help="Case folders (with _output) or _output directories.")
+    parser.add_argument("--data", default=str(lister_dir), help="Folder of the T=*.csv files.")
+    parser.add_argument("--threshold", default=1e-3, type=float, help="Depth contour taken as the front.")
+    parser.add_argument("--spacing", default=1e-4, type=float, help="Spacing of the densified front.")
+    parser.add_argument("--nprocs", default=None, type=int, help="Number of worker processes.")
+    parser.add_argument("--out", default="front-scores.csv", help="Output CSV.")
+    args = parser.parse_args()
+
+    output_dirs = []
+    for run in args.runs:
+        run = os.path.abspath(os.path.expanduser(run))
+        output_dirs.append(os.path.join(run, "_output") if os.path.isdir(os.path.join(run, "_output")) else run)
+
+    table = score_runs(output_dirs, load_lister(args.data), args.threshold, args.spacing, args.nprocs)
+    save_table(args.out, table)
+
+    for row in table:
+        print("{}, T = {:g}: mean {:.4e}, max {:.4e}".format(
+            row["run"], row["t_exp"], row["mean_dist"], row["max_dist"]))
+
+
+if __name__ == "__main__":
+    main()
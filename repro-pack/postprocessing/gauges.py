@@ -0,0 +1,367 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Columnar storage and vectorized queries of gauge time series.
+
+All gaugeXXXXX.txt files of a run are parsed in one pass into flat columns
+(gauge_id, level, t, q) sorted by gauge and time, and saved to
+`_output/gauges.npz`. Later loads only read the npz unless the gauge files
+have changed. Queries (max, arrival time, value at a time) operate on all
+gauges at once.
+
+Virtual gauges are sampled from frame outputs after a run, at any number of
+points not declared in setrun.py, into the same columnar layout.
+
+Examples (print the max eta of every gauge; sample the points in a CSV file
+of id,x,y rows from all frames):
+
+    $ python gauges.py summary ../runs/malpasset-dam-break-landspill/_output --var 3
+    $ python gauges.py virtual ../runs/malpasset-dam-break-landspill/_output --points points.csv
+"""
+import os
+import re
+import argparse
+import concurrent.futures
+import numpy
+from framereader import list_frames, open_frame
+from helpers import get_patch_index, probe
+
+# the first header line of a gauge file in GeoClaw 5.7
+_HEADER_RE = re.compile(r"gauge_id=\s*(\d+)\s+location=\(\s*(\S+)\s+(\S+)\s*\)")
+
+
+class GaugeStore:
+    """Time series of all gauges of a run in flat columns.
+
+    Rows are sorted by gauge and then by time; the rows of the i-th gauge in
+    `ids` are `starts[i]:starts[i+1]`.
+
+    Args / Attributes:
+    ------------------
+        ids: 1D int array; sorted gauge IDs.
+        x, y: 1D float arrays; gauge locations, aligned with ids.
+        starts: 1D int array of size ids.size+1; row offsets of each gauge.
+        gauge_id: 1D int array; the gauge ID of each row.
+        level: 1D int array; the AMR level each row was sampled from.
+        t: 1D float array; the time of each row.
+        q: 2D float array of shape (nrows, nvars); for GeoClaw, the columns
+            are depth, hu, hv, and eta.
+    """
+    # pylint: disable=too-many-arguments
+
+    def __init__(self, ids, x, y, starts, gauge_id, level, t, q):
+        self.ids = ids
+        self.x = x
+        self.y = y
+        self.starts = starts
+        self.gauge_id = gauge_id
+        self.level = level
+        self.t = t
+        self.q = q
+
+    def save(self, filepath, **extras):
+        """Save the columns (and extra arrays) to an npz file."""
+        numpy.savez(
+            filepath, ids=self.ids, x=self.x, y=self.y, starts=self.starts, gauge_id=self.gauge_id,
+            level=self.level, t=self.t, q=self.q, **extras
+        )
+
+    @classmethod
+    def load(cls, filepath):
+        """Load a GaugeStore from an npz file written by save."""
+        with numpy.load(filepath) as data:
+            return cls(*[data[key] for key in ["ids", "x", "y", "starts", "gauge_id", "level", "t", "q"]])
+
+    @classmethod
+    def from_arrays(cls, ids, xs, ys, datasets):
+        """Build a GaugeStore from per-gauge 2D arrays of columns level, t, and the variables."""
+
+        order = numpy.argsort(ids, kind="stable")
+        ids = numpy.asarray(ids, dtype=numpy.int64)[order]
+        datasets = [datasets[i] for i in order]
+        nvars = max([data.shape[1] - 2 for data in datasets if data.size] + [0])
+        datasets = [data if data.size else numpy.zeros((0, nvars+2)) for data in datasets]
+
+        counts = numpy.array([data.shape[0] for data in datasets], dtype=numpy.int64)
+        data = numpy.concatenate(datasets) if datasets else numpy.zeros((0, nvars+2))
+
+        return cls(
+            ids, numpy.asarray(xs, dtype=numpy.float64)[order], numpy.asarray(ys, dtype=numpy.float64)[order],
+            numpy.concatenate(([0], numpy.cumsum(counts))), numpy.repeat(ids, counts),
+            data[:, 0].astype(numpy.int64), data[:, 1], data[:, 2:]
+        )
+
+    def _positions(self, gauge_ids):
+        """Positions of gauge IDs in self.ids; all gauges if gauge_ids is None."""
+
+        if gauge_ids is None:
+            return numpy.arange(self.ids.size)
+
+        gauge_ids = numpy.asarray(gauge_ids)
+        pos = numpy.searchsorted(self.ids, gauge_ids)
+        if numpy.any(pos >= self.ids.size) or numpy.any(self.ids[numpy.minimum(pos, self.ids.size-1)] != gauge_ids):
+            raise KeyError("Unknown gauge IDs in {}".format(gauge_ids))
+
+        return pos
+
+    def series(self, gauge_id):
+        """Get (t, q) of one gauge; q has shape (nvars, nrows) as pyclaw.GaugeSolution.q."""
+        pos = self._positions([gauge_id])[0]
+        rows = slice(self.starts[pos], self.starts[pos+1])
+        return self.t[rows], self.q[rows].T
+
+    def max(self, var, gauge_ids=None):
+        """Get the max of a variable of each gauge, ignoring NaN; NaN for gauges without data."""
+
+        if not self.ids.size:
+            return numpy.zeros(0)
+
+        pos = self._positions(gauge_ids)
+        values = numpy.append(self.q[:, var], -numpy.inf)  # padding keeps reduceat indices valid
+        result = numpy.fmax.reduceat(values, self.starts[:-1])[pos]
+        return numpy.where(numpy.diff(self.starts)[pos] > 0, result, numpy.nan)
+
+    def arrival(self, var=0, tol=0., gauge_ids=None):
+        """Get the first time a variable exceeds tol at each gauge; NaN if never."""
+
+        if not self.ids.size:
+            return numpy.zeros(0)
+
+        pos = self._positions(gauge_ids)
+        rows = numpy.where(self.q[:, var] > tol, numpy.arange(self.t.size), self.t.size)
+        first = numpy.minimum.reduceat(numpy.append(rows, self.t.size), self.starts[:-1])[pos]
+        first = numpy.where(first < self.starts[pos+1], first, self.t.size)
+        return numpy.append(self.t, numpy.nan)[first]
+
+    def value_at(self, time, var, gauge_ids=None):
+        """Get a variable of each gauge at a time, linearly interpolated; NaN outside the records."""
+
+        pos = self._positions(gauge_ids)
+        counts = numpy.diff(self.starts)
+
+        # shift each gauge's times by a multiple of the total span so one sorted array holds all gauges
+        span = (self.t.max() - self.t.min() + 1.) if self.t.size else 1.
+        rank = numpy.repeat(numpy.arange(self.ids.size), counts)
+        keys = self.t + rank * span
+        target = time + pos * span
+
+        right = numpy.clip(numpy.searchsorted(keys, target), self.starts[pos]+1, self.starts[pos+1]-1)
+        left = right - 1
+        valid = (counts[pos] > 1) & (time >= self.t[numpy.minimum(left, self.t.size-1)])
+        valid &= time <= self.t[numpy.minimum(right, self.t.size-1)]
+        left, right = numpy.where(valid, left, 0), numpy.where(valid, right, 0)
+
+        t0, t1 = self.t[left], self.t[right]
+        weight = numpy.where(t1 > t0, (time - t0) / numpy.where(t1 > t0, t1 - t0, 1.), 0.)
+        values = (1. - weight) * self.q[left, var] + weight * self.q[right, var]
+        return numpy.where(valid, values, numpy.nan)
+
+
+def gauge_files(output_dir):
+    """Sorted paths of the gauge files in an output directory."""
+    names = sorted(name for name in os.listdir(output_dir) if re.fullmatch(r"gauge\d+\.txt", name))
+    return [os.path.join(output_dir, name) for name in names]
+
+
+def parse_gauge_text(text):
+    """Parse the content of a GeoClaw gauge file.
+
+    Returns:
+    --------
+        gauge_id, x, y: from the header (None if the header is missing).
+        data: a 2D numpy.ndarray; columns are level, t, and the variables.
+    """
+
+    header = _HEADER_RE.search(text)
+    gauge_id, x, y = (None, None, None) if header is None else (
+        int(header.group(1)), float(header.group(2)), float(header.group(3)))
+
+    lines = [line for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+    if not lines:
+        return gauge_id, x, y, numpy.zeros((0, 0))
+
+    ncols = len(lines[0].split())
+    data = numpy.array(" ".join(lines).replace("D", "E").split(), dtype=numpy.float64).reshape(-1, ncols)
+    return gauge_id, x, y, data
+
+
+def read_gauge_files(output_dir):
+    """Parse all gauge files of a run in one pass.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+
+    Returns:
+    --------
+        A GaugeStore.
+    """
+
+    ids, xs, ys, datasets = [], [], [], []
+    for filepath in gauge_files(output_dir):
+        with open(filepath, "r") as fileobj:
+            gauge_id, x, y, data = parse_gauge_text(fileobj.read())
+
+        if gauge_id is None:  # fall back to the file name
+            gauge_id = int(os.path.basename(filepath)[5:-4])
+
+        ids.append(gauge_id)
+        xs.append(numpy.nan if x is None else x)
+        ys.append(numpy.nan if y is None else y)
+        datasets.append(data)
+
+    return GaugeStore.from_arrays(ids, xs, ys, datasets)
+
+
+def _file_stats(filepaths):
+    """(mtime in ns, size) of each file."""
+    stats = [os.stat(filepath) for filepath in filepaths]
+    return numpy.array([[stat.st_mtime_ns, stat.st_size] for stat in stats], dtype=numpy.int64).reshape(-1, 2)
+
+
+def load_gauge_store(output_dir, cache=True):
+    """Get the GaugeStore of a run, from `_output/gauges.npz` if it is up to date.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        cache: bool; whether to read and write gauges.npz.
+
+    Returns:
+    --------
+        A GaugeStore.
+    """
+
+    stats = _file_stats(gauge_files(output_dir))
+    filepath = os.path.join(output_dir, "gauges.npz")
+
+    if cache and os.path.isfile(filepath):
+        with numpy.load(filepath) as data:
+            fresh = "stats" in data and numpy.array_equal(data["stats"], stats)
+        if fresh:
+            return GaugeStore.load(filepath)
+
+    store = read_gauge_files(output_dir)
+
+    if cache:
+        store.save(filepath, stats=stats)
+
+    return store
+
+
+def _virtual_chunk(output_dir, frames, x, y, method):
+    """Sample depth, hu, hv, and eta at points from a chunk of frames.
+
+    Returns:
+    --------
+        times: 1D array of shape (nframes,).
+        levels: 2D int array of shape (nframes, npoints); 0 outside the domain.
+        values: 3D array of shape (nframes, 4, npoints).
+    """
+
+    bbox = [x.min(), y.min(), x.max(), y.max()]
+    times = numpy.zeros(len(frames))
+    levels = numpy.zeros((len(frames), x.size), dtype=numpy.int64)
+    values = numpy.full((len(frames), 4, x.size), numpy.nan)
+
+    for i, fno in enumerate(frames):
+        soln = open_frame(output_dir, fno, bbox=bbox)
+        index = get_patch_index(soln)
+        times[i] = soln.t
+
+        # no patch intersects the points' bounding box; all points are outside the domain
+        if not index.level.size:
+            continue
+
+        pids = index.locate_finest(x, y)
+        levels[i] = numpy.where(pids >= 0, index.level[numpy.maximum(pids, 0)], 0)
+        values[i] = probe(soln, [0, 1, 2, 3], x, y, None, method, pids=pids)
+
+    return times, levels, values
+
+
+def virtual_gauges(output_dir, x, y, ids=None, frames=None, method="nearest", nprocs=None):
+    """Sample time series at points from the frame outputs of a run.
+
+    Each point takes the values of the finest patch covering it in every frame.
+    Frames are split into chunks sampled in parallel.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        x, y: 1D numpy.ndarray; coordinates of the points.
+        ids: None or a 1D int array of gauge IDs; None means 0, 1, 2, ...
+        frames: an iterable of frame numbers; None means all frames.
+        method: the interpolation engine; see helpers.probe.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+
+    Returns:
+    --------
+        A GaugeStore with one row per point per frame; q holds depth, hu, hv,
+        and eta (NaN outside the domain), and level the AMR level sampled.
+    """
+    # pylint: disable=too-many-arguments
+
+    x = numpy.asarray(x, dtype=numpy.float64).ravel()
+    y = numpy.asarray(y, dtype=numpy.float64).ravel()
+    ids = numpy.arange(x.size) if ids is None else numpy.asarray(ids, dtype=numpy.int64)
+    frames = list_frames(output_dir) if frames is None else sorted(frames)
+    chunks = [c.tolist() for c in numpy.array_split(numpy.asarray(frames), nprocs or os.cpu_count() or 1) if c.size]
+
+    with concurrent.futures.ProcessPoolExecutor(nprocs) as executor:
+        results = list(executor.map(
+            _virtual_chunk, [output_dir]*len(chunks), chunks, [x]*len(chunks), [y]*len(chunks),
+            [method]*len(chunks)
+        ))
+
+    times = numpy.concatenate([numpy.zeros(0)] + [res[0] for res in results])
+    levels = numpy.concatenate([numpy.zeros((0, x.size), dtype=numpy.int64)] + [res[1] for res in results])
+    values = numpy.concatenate([numpy.zeros((0, 4, x.size))] + [res[2] for res in results])
+
+    # from (frame, variable, point) to rows ordered by point and then time
+    order = numpy.argsort(ids, kind="stable")
+    nframes = times.size
+    return GaugeStore(
+        ids[order], x[order], y[order], numpy.arange(x.size+1) * nframes, numpy.repeat(ids[order], nframes),
+        levels[:, order].T.ravel(), numpy.tile(times, x.size), values[:, :, order].transpose(2, 0, 1).reshape(-1, 4)
+    )
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Gauge time series of GeoClaw runs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summary = subparsers.add_parser("summary", help="Build the gauge store of a run and print per-gauge maxima.")
+    summary.add_argument("output_dir", help="The _output directory of a run.")
+    summary.add_argument("--var", default=0, type=int, help="Index of the variable (0: depth, 3: eta).")
+
+    virtual = subparsers.add_parser("virtual", help="Sample virtual gauges from frame outputs.")
+    virtual.add_argument("output_dir", help="The _output directory of a run.")
+    virtual.add_argument("--points", required=True, help="CSV file of id,x,y rows (lines starting with # skipped).")
+    virtual.add_argument("--method", default="nearest", help="Interpolation engine.")
+    virtual.add_argument("--nprocs", default=None, type=int, help="Number of worker processes.")
+    virtual.add_argument("--out", default=None, help="Output npz (default: <output_dir>/virtual_gauges.npz).")
+
+    args = parser.parse_args()
+    output_dir = os.path.abspath(os.path.expanduser(args.output_dir))
+
+    if args.command == "summary":
+        store = load_gauge_store(output_dir)
+        for gid, vmax, arrival in zip(store.ids, store.max(args.var), store.arrival(0)):
+            print("gauge {}: max {:.6e}, arrival time {:.6e}".format(gid, vmax, arrival))
+    elif args.command == "virtual":
+        points = numpy.loadtxt(args.points, delimiter=",", ndmin=2)
+        store = virtual_gauges(output_dir, points[:, 1], points[:, 2], points[:, 0], method=args.method,
+                               nprocs=args.nprocs)
+        store.save(args.out or os.path.join(output_dir, "virtual_gauges.npz"))
+
+
+if __name__ == "__main__":
+    main()
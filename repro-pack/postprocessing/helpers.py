@@ -9,9 +9,387 @@
 """Helper functions.
 """
 import os
+import hashlib
+import collections
+import concurrent.futures
 import requests
 import numpy
 import scipy.interpolate
+from framereader import frame_times, list_frames, open_frame
+
+# available engines of interpolate and probe
+INTERP_METHODS = ("nearest", "bilinear", "spline")
+
+# named fields in GeoClaw frame outputs (q[3] is the water surface elevation)
+FIELDS = {"depth": 0, "hu": 1, "hv": 2, "eta": 3}
+
+def _velocity_component(component):
+    """Get a function computing a velocity component from q; zero in dry cells."""
+
+    def func(q, dry_tol):
+        wet = q[0] > dry_tol
+        return numpy.where(wet, q[component] / numpy.where(wet, q[0], 1.), 0.)
+
+    return func
+
+def _speed(q, dry_tol):
+    """Flow speed hypot(hu, hv)/h; zero in dry cells."""
+    wet = q[0] > dry_tol
+    return numpy.where(wet, numpy.hypot(q[1], q[2]) / numpy.where(wet, q[0], 1.), 0.)
+
+# fields derived from q; each takes q (leading axis of equations) and the dry tolerance
+DERIVED_FIELDS = {"u": _velocity_component(1), "v": _velocity_component(2), "speed": _speed}
+
+class _LRUCache:
+    """A minimal least-recently-used cache with a bounded number of entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+
+    def get(self, key):
+        """Get an entry and mark it as the most recently used; None if missing."""
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return None
+        return self._data[key]
+
+    def put(self, key, value):
+        """Add an entry and evict the least recently used ones if full."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self.resize(self.maxsize)
+
+    def resize(self, maxsize):
+        """Change the max number of entries, evicting the oldest ones if needed."""
+        self.maxsize = maxsize
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries."""
+        self._data.clear()
+
+# per-patch target indices and weights reused by interpolate across frames
+_INTERP_CACHE = _LRUCache(4096)
+
+def set_interp_cache_size(maxsize):
+    """Set the max number of patches whose interpolation data are cached.
+
+    The cache is keyed by patch geometry and the target grid, so consecutive
+    frames with the same AMR patches only gather the new q values. A size of 0
+    disables caching.
+
+    Args:
+    -----
+        maxsize: int; the max number of cached patches.
+    """
+    _INTERP_CACHE.resize(maxsize)
+
+def clear_interp_cache():
+    """Remove all cached interpolation data."""
+    _INTERP_CACHE.clear()
+
+class PatchIndex:
+    """A per-level uniform bucket grid over the AMR patches of a solution.
+
+    Patches on the same AMR level do not overlap, and the bucket size is about
+    the size of a typical patch, so each bucket only holds a handful of
+    patches. Looking up the patches around a point or a box is then constant
+    time no matter how many patches a frame has.
+
+    Args:
+    -----
+        solution: a pyclaw.Solution object or a framereader.Frame.
+
+    Attributes:
+    -----------
+        states: the list of states in the solution; patch IDs index this list.
+        level: 1D int array; the AMR level of each patch.
+        lower, upper: 2D arrays of shape (npatches, 2); lower-left and
+            upper-right corners of each patch.
+        delta: 2D array of shape (npatches, 2); cell sizes of each patch.
+        shape: 2D int array of shape (npatches, 2); numbers of cells of each patch.
+        levels: 1D int array; the sorted AMR levels present in the solution.
+    """
+
+    def __init__(self, solution):
+        self.states = list(solution.states)
+        npatches = len(self.states)
+
+        # a framereader.Frame already has the geometry in a structured array
+        table = getattr(solution, "patches", None)
+
+        if table is not None:
+            self.level = table["level"].astype(numpy.int64)
+            self.lower = numpy.column_stack((table["xlow"], table["ylow"]))
+            self.delta = numpy.column_stack((table["dx"], table["dy"]))
+            self.shape = numpy.column_stack((table["nx"], table["ny"])).astype(numpy.int64)
+            self.upper = self.lower + self.shape * self.delta
+        else:
+            self.level = numpy.zeros(npatches, dtype=numpy.int64)
+            self.lower = numpy.zeros((npatches, 2), dtype=numpy.float64)
+            self.upper = numpy.zeros((npatches, 2), dtype=numpy.float64)
+            self.delta = numpy.zeros((npatches, 2), dtype=numpy.float64)
+            self.shape = numpy.zeros((npatches, 2), dtype=numpy.int64)
+
+            for i, state in enumerate(self.states):
+                p = state.patch
+                self.level[i] = p.level
+                self.lower[i] = p.lower_global[:2]
+                self.upper[i] = p.upper_global[:2]
+                self.delta[i] = p.delta[:2]
+                self.shape[i] = p.num_cells_global[:2]
+
+        self.levels = numpy.unique(self.level)
+        self._buckets = {lv: self._build_buckets(numpy.flatnonzero(self.level == lv)) for lv in self.levels}
+
+    def _build_buckets(self, ids):
+        """Build the bucket grid (in CSR layout) of the patches in `ids`."""
+
+        lower, upper = self.lower[ids], self.upper[ids]
+        origin = lower.min(axis=0)
+        size = numpy.median(upper-lower, axis=0)
+        nbuckets = numpy.maximum(numpy.ceil((upper.max(axis=0)-origin)/size).astype(numpy.int64), 1)
+
+        lo = self._bucket_coords(lower, origin, size, nbuckets)
+        hi = self._bucket_coords(upper, origin, size, nbuckets)
+
+        # (bucket, patch) pairs; a patch is registered in every bucket it touches
+        buckets, members = [], []
+        for pid, (i0, j0), (i1, j1) in zip(ids, lo, hi):
+            bi, bj = numpy.meshgrid(numpy.arange(i0, i1+1), numpy.arange(j0, j1+1), indexing="ij")
+            buckets.append((bi*nbuckets[1]+bj).ravel())
+            members.append(numpy.full(buckets[-1].size, pid))
+
+        buckets, members = numpy.concatenate(buckets), numpy.concatenate(members)
+        order = numpy.argsort(buckets, kind="stable")
+        offsets = numpy.searchsorted(buckets[order], numpy.arange(nbuckets[0]*nbuckets[1]+1))
+
+        return origin, size, nbuckets, offsets, members[order]
+
+    @staticmethod
+    def _bucket_coords(coords, origin, size, nbuckets):
+        """Bucket indices of coordinates; out-of-range coordinates are clipped."""
+        return numpy.clip(numpy.floor((coords-origin)/size).astype(numpy.int64), 0, nbuckets-1)
+
+    def geometry_key(self, pid):
+        """Get a hashable key of a patch's level, bounds, cell sizes, and cell numbers."""
+        return (int(self.level[pid]),) + tuple(self.lower[pid]) + tuple(self.upper[pid]) + \
+            tuple(self.delta[pid]) + tuple(int(n) for n in self.shape[pid])
+
+    def query_level(self, level):
+        """Get the IDs of all patches on an AMR level."""
+        return numpy.flatnonzero(self.level == level)
+
+    def query_box(self, xmin, xmax, ymin, ymax, level):
+        """Get the IDs of the patches on an AMR level that overlap a closed box.
+
+        Args:
+        -----
+            xmin, xmax, ymin, ymax: floats; the box.
+            level: int; the target AMR level.
+
+        Returns:
+        --------
+            ids: a sorted 1D int array of patch IDs.
+        """
+
+        if level not in self._buckets:
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        origin, size, nbuckets, offsets, members = self._buckets[level]
+        lo = self._bucket_coords(numpy.array([xmin, ymin]), origin, size, nbuckets)
+        hi = self._bucket_coords(numpy.array([xmax, ymax]), origin, size, nbuckets)
+
+        # buckets of one bucket row are contiguous in the CSR layout
+        ids = numpy.unique(numpy.concatenate([
+            members[offsets[i*nbuckets[1]+lo[1]]:offsets[i*nbuckets[1]+hi[1]+1]]
+            for i in range(lo[0], hi[0]+1)
+        ]))
+
+        overlap = (
+            (self.lower[ids, 0] <= xmax) & (self.upper[ids, 0] >= xmin) &
+            (self.lower[ids, 1] <= ymax) & (self.upper[ids, 1] >= ymin)
+        )
+
+        return ids[overlap]
+
+    def locate(self, x, y, level):
+        """Find the patch on an AMR level that contains each point.
+
+        Args:
+        -----
+            x, y: 1D numpy.ndarray; coordinates of the points.
+            level: int; the target AMR level.
+
+        Returns:
+        --------
+            ids: a 1D int array of patch IDs; -1 for points outside the level.
+        """
+
+        x = numpy.asarray(x, dtype=numpy.float64).ravel()
+        y = numpy.asarray(y, dtype=numpy.float64).ravel()
+        ids = numpy.full(x.size, -1, dtype=numpy.int64)
+
+        if level not in self._buckets:
+            return ids
+
+        origin, size, nbuckets, offsets, members = self._buckets[level]
+        bkt = self._bucket_coords(numpy.column_stack((x, y)), origin, size, nbuckets)
+        bkt = bkt[:, 0] * nbuckets[1] + bkt[:, 1]
+
+        # expand to (point, candidate patch) pairs without a Python loop
+        counts = offsets[bkt+1] - offsets[bkt]
+        pts = numpy.repeat(numpy.arange(x.size), counts)
+        cands = members[
+            numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts)-counts, counts) +
+            numpy.repeat(offsets[bkt], counts)
+        ]
+
+        inside = (
+            (x[pts] >= self.lower[cands, 0]) & (x[pts] <= self.upper[cands, 0]) &
+            (y[pts] >= self.lower[cands, 1]) & (y[pts] <= self.upper[cands, 1])
+        )
+        ids[pts[inside]] = cands[inside]
+
+        return ids
+
+    def locate_finest(self, x, y):
+        """Find the patch of the finest AMR level that contains each point.
+
+        Returns:
+        --------
+            ids: a 1D int array of patch IDs; -1 for points outside the domain.
+        """
+
+        ids = numpy.full(numpy.size(x), -1, dtype=numpy.int64)
+        for lv in self.levels:
+            found = self.locate(x, y, lv)
+            ids = numpy.where(found >= 0, found, ids)
+        return ids
+
+    def finest_cells(self, pid):
+        """Get a bool array of shape (nx, ny); True for cells of a patch that no finer patch covers."""
+
+        nx, ny = self.shape[pid]
+        i, j = numpy.meshgrid(numpy.arange(nx), numpy.arange(ny), indexing="ij")
+        x = self.lower[pid, 0] + (i.ravel() + 0.5) * self.delta[pid, 0]
+        y = self.lower[pid, 1] + (j.ravel() + 0.5) * self.delta[pid, 1]
+        bounds = self.lower[pid, 0], self.upper[pid, 0], self.lower[pid, 1], self.upper[pid, 1]
+
+        mask = numpy.ones(x.size, dtype=bool)
+        for lv in self.levels[self.levels > self.level[pid]]:
+            if self.query_box(*bounds, lv).size:
+                mask &= self.locate(x, y, lv) < 0
+
+        return mask.reshape(nx, ny)
+
+    def axis_weights(self, pid, axis, coords, method="bilinear"):
+        """Get cell indices and weights of coordinates along one axis of a patch.
+
+        Cell indices come directly from the patch's lower corner and cell size,
+        so no interpolation object has to be built.
+
+        Args:
+        -----
+            pid: int; the patch ID.
+            axis: int; 0 for x and 1 for y.
+            coords: 1D numpy.ndarray; the coordinates along the axis.
+            method: either "nearest" or "bilinear".
+
+        Returns:
+        --------
+            i0, i1: 1D int arrays; indices of the two cells bracketing the
+                coordinates (identical for "nearest").
+            w: 1D numpy.ndarray; the weights of the cells i1 (zeros for "nearest").
+        """
+
+        ncells = self.shape[pid, axis]
+        frac = (coords - self.lower[pid, axis]) / self.delta[pid, axis]
+
+        if method == "nearest":
+            # the cell containing the coordinate; upper borders go to the last cells
+            i0 = numpy.clip(numpy.floor(frac).astype(numpy.int64), 0, ncells-1)
+            return i0, i0, numpy.zeros(i0.size)
+
+        if method != "bilinear":
+            raise ValueError("Unrecognized method: {}".format(method))
+
+        # fractional indices w.r.t. cell centers; constant extrapolation in the outer half cells
+        frac -= 0.5
+        i0 = numpy.clip(numpy.floor(frac).astype(numpy.int64), 0, max(ncells-2, 0))
+        i1 = numpy.minimum(i0+1, ncells-1)
+        return i0, i1, numpy.clip(frac-i0, 0., 1.)
+
+def get_patch_index(solution):
+    """Get the PatchIndex of a solution, building it on the first call.
+
+    The index is cached on the solution object, so all helpers share the one
+    built for a frame.
+
+    Args:
+    -----
+        solution: a pyclaw.Solution object or a framereader.Frame.
+
+    Returns:
+    --------
+        index: a PatchIndex.
+    """
+
+    index = getattr(solution, "_patch_index", None)
+
+    # rebuild if the states have been replaced since the index was built
+    if (
+        index is None or len(index.states) != len(solution.states) or
+        any(s1 is not s2 for s1, s2 in zip(index.states, solution.states))
+    ):
+        index = PatchIndex(solution)
+        solution._patch_index = index  # pylint: disable=protected-access
+
+    return index
+
+def iter_frames(output_dir, frames=None, prefetch=2, **kwargs):
+    """Iterate over frames while the next ones are read in background threads.
+
+    Frames are yielded in the given order. At most `prefetch` frames are being
+    read or waiting ahead of the one the caller holds, so memory is bounded by
+    prefetch+1 frames.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        frames: an iterable of frame numbers; None means all frames.
+        prefetch: int; the number of frames read ahead.
+        kwargs: keyword arguments to framereader.open_frame (e.g., read_aux,
+            bbox, levels). Frames are read into memory (mmap=False) unless
+            specified otherwise, so that the I/O really happens in background.
+
+    Yields:
+    -------
+        (frame number, framereader.Frame)
+    """
+
+    frames = list_frames(output_dir) if frames is None else frames
+    kwargs.setdefault("mmap", False)
+    pending = collections.deque()
+
+    with concurrent.futures.ThreadPoolExecutor(max(prefetch, 1)) as executor:
+        try:
+            for fno in frames:
+                pending.append((fno, executor.submit(open_frame, output_dir, fno, **kwargs)))
+                if len(pending) > prefetch:
+                    fno, future = pending.popleft()
+                    yield fno, future.result()
+
+            while pending:
+                fno, future = pending.popleft()
+                yield fno, future.result()
+        finally:
+            # the caller may stop early; don't wait for frames nobody will use
+            for _, future in pending:
+                future.cancel()
 
 def get_max_AMR_level(solution):
     """Get the max AMR level in a solution object.
@@ -25,13 +403,8 @@ def get_max_AMR_level(solution):
         max_level: the max AMR level.
     """
 
-    max_level = 1
-
-    for state in solution.states:
-        p = state.patch
-        max_level = p.level if p.level > max_level else max_level
-
-    return max_level
+    levels = get_patch_index(solution).levels
+    return max(1, int(levels.max())) if levels.size else 1
 
 def get_level_ncells_volumes(solution):
     """Get level-wise numbers of cells and fluid volumes.
@@ -72,7 +445,7 @@ def get_min_max_values(solution, field=0):
         max_val: the maximum value.
     """
 
-    min_val, max_val = 1e38, 0.
+    min_val, max_val = numpy.inf, -numpy.inf
 
     for state in solution.states:
         min_temp = state.q[field, :, :].min()
@@ -88,7 +461,8 @@ def get_state_interpolator(state, field=0, **kwargs):
     Args:
     -----
         soultions: a pyclaw.Solution object.
-        field: the index of the target field in the solution.
+        field: the index of the target field in the solution, or a 2D array of
+            cell values on this state's patch (e.g., a derived field).
         kwargs: keyword arguments to scipy.interpolate.RectBivariateSpline.
 
     Returns:
@@ -113,7 +487,7 @@ def get_state_interpolator(state, field=0, **kwargs):
     assert numpy.abs(dy-p.delta[1]) < 1e-6, "{} {}".format(dy, p.delta[1])
 
     interp = scipy.interpolate.RectBivariateSpline(
-        x=x, y=y, z=state.q[field, :, :],
+        x=x, y=y, z=state.q[field, :, :] if numpy.ndim(field) == 0 else field,
         bbox=[
             p.lower_global[0], p.upper_global[0],
             p.lower_global[1], p.upper_global[1]
@@ -122,44 +496,335 @@ def get_state_interpolator(state, field=0, **kwargs):
 
     return interp
 
-def interpolate(solution, field, x, y, level=1):
+def _patch_weights(index, pid, x, y, method, grid=True):
+    """Get cell indices and weights of target coordinates in one patch.
+
+    Args:
+    -----
+        index: a PatchIndex.
+        pid: int; the ID of the patch.
+        x, y: 1D numpy.ndarray; target coordinates inside the patch.
+        method: "nearest", "bilinear", or "spline".
+        grid: bool; whether x and y define a grid or scattered points.
+
+    Returns:
+    --------
+        weights: a tuple of (ix0, ix1, wx, iy0, iy1, wy), already shaped for
+            broadcasting if grid; None for "spline", which needs no weights.
+    """
+
+    if method == "spline":
+        return None
+
+    ix0, ix1, wx = index.axis_weights(pid, 0, x, method)
+    iy0, iy1, wy = index.axis_weights(pid, 1, y, method)
+
+    if grid:
+        return ix0[:, None], ix1[:, None], wx[:, None], iy0[None, :], iy1[None, :], wy[None, :]
+
+    return ix0, ix1, wx, iy0, iy1, wy
+
+def resolve_fields(field):
+    """Normalize the field argument of interpolate, probe, and the run-wide tools.
+
+    Returns:
+    --------
+        fields: a list of ints (indices in q) and callables (derived fields).
+        scalar: bool; whether a single field, rather than a list, was requested.
+    """
+
+    scalar = isinstance(field, (int, numpy.integer, str)) or callable(field)
+    fields = []
+
+    for fld in ([field] if scalar else field):
+        if isinstance(fld, str):
+            if fld not in FIELDS and fld not in DERIVED_FIELDS:
+                raise ValueError("Unrecognized field: {}".format(fld))
+            fld = FIELDS.get(fld, DERIVED_FIELDS.get(fld))
+        fields.append(int(fld) if isinstance(fld, (int, numpy.integer)) else fld)
+
+    return fields, scalar
+
+def _field_values(q, fields, dry_tol, i, j):
+    """Stack the requested fields evaluated on q (leading axis of equations) at cells (i, j)."""
+
+    # plain fields only gather the rows they need
+    if all(isinstance(fld, int) for fld in fields):
+        return q[numpy.array(fields).reshape((-1,)+(1,)*numpy.ndim(i)), i, j]
+
+    q = q[:, i, j]
+    return numpy.stack([q[fld] if isinstance(fld, int) else fld(q, dry_tol) for fld in fields])
+
+def _sample_patch(index, pid, fields, x, y, method, grid=True, weights=None, dry_tol=1e-4):
+    """Sample fields of one patch at target coordinates.
+
+    All fields share the cell indices and weights. Derived fields are evaluated
+    on the gathered cell values before blending, which is the same as
+    evaluating them on the whole patch first.
+
+    Args:
+    -----
+        index: a PatchIndex.
+        pid: int; the ID of the patch.
+        fields: a list of ints and callables from resolve_fields.
+        x, y: 1D numpy.ndarray; target coordinates inside the patch.
+        method: "nearest", "bilinear", or "spline".
+        grid: bool; whether x and y define a grid or scattered points.
+        weights: optional precomputed output of _patch_weights.
+        dry_tol: float; the dry tolerance used by derived fields.
+
+    Returns:
+    --------
+        values: an array of shape (len(fields), y.size, x.size) if grid else
+            (len(fields), x.size).
+    """
+
+    state = index.states[pid]
+
+    if method == "spline":
+        values = []
+        for fld in fields:
+            interp = get_state_interpolator(state, fld if isinstance(fld, int) else fld(state.q, dry_tol))
+            values.append(interp(x, y).T if grid else interp(x, y, grid=False))
+        return numpy.stack(values)
+
+    if weights is None:
+        weights = _patch_weights(index, pid, x, y, method, grid)
+
+    ix0, ix1, wx, iy0, iy1, wy = weights
+    q = state.q
+
+    if method == "nearest":
+        values = _field_values(q, fields, dry_tol, ix0, iy0)
+    else:
+        values = (
+            (1. - wx) * (
+                (1. - wy) * _field_values(q, fields, dry_tol, ix0, iy0) +
+                wy * _field_values(q, fields, dry_tol, ix0, iy1)
+            ) +
+            wx * (
+                (1. - wy) * _field_values(q, fields, dry_tol, ix1, iy0) +
+                wy * _field_values(q, fields, dry_tol, ix1, iy1)
+            )
+        )
+
+    return values.swapaxes(1, 2) if grid else values
+
+def interpolate(solution, field, x, y, level=1, method="spline", dry_tol=1e-4):
     """Do the interpolation.
 
     Args:
     -----
         solution: a pyclaw.Solution instance.
-        field: int; the target field in the solution.
+        field: the target field in the solution, or a list of them to be
+            interpolated in one traversal of the patches. A field is an int
+            index, a key of FIELDS or DERIVED_FIELDS (e.g., "speed"), or a
+            callable taking q and dry_tol.
         x: 1D numpy.ndarray; x coordinates to be interpolated on.
         y: 1D numpy.ndarray; y coordinates to be interpolated on.
-        level: int; the target AMR level.
+        level: int or None; the target AMR level; None samples every target
+            point from the finest level covering it (the composite mode).
+        method: the interpolation engine; "spline" fits a RectBivariateSpline
+            to each patch, while "nearest" and "bilinear" gather directly from
+            the cells and are much cheaper.
+        dry_tol: float; cells shallower than this are dry in derived fields.
 
     Returns:
     --------
-        values: a 2D numpy.ndarray of shape (y.size, x.size).
+        values: a 2D numpy.ndarray of shape (y.size, x.size), or a 3D one of
+            shape (number of fields, y.size, x.size) if field is a list.
     """
 
+    if method not in INTERP_METHODS:
+        raise ValueError("Unrecognized method: {}".format(method))
+
+    x = numpy.ascontiguousarray(x, dtype=numpy.float64)
+    y = numpy.ascontiguousarray(y, dtype=numpy.float64)
+
+    fields, scalar = resolve_fields(field)
+
     # allocate space for interpolated results
-    values = numpy.zeros((y.size, x.size), dtype=numpy.float64)
+    values = numpy.zeros((len(fields), y.size, x.size), dtype=numpy.float64)
+
+    if not (x.size and y.size):
+        return values[0] if scalar else values
+
+    # sorted copies of the target coordinates so range lookups are binary searches
+    xorder, yorder = numpy.argsort(x, kind="stable"), numpy.argsort(y, kind="stable")
+    xsorted, ysorted = x[xorder], y[yorder]
+
+    # only the patches at the target level(s) that overlap the target coordinates; in the
+    # composite mode, patches are visited from coarse to fine so finer values overwrite coarser
+    index = get_patch_index(solution)
+    levels = index.levels if level is None else [level]
+    pids = numpy.concatenate(
+        [numpy.zeros(0, dtype=numpy.int64)] +
+        [index.query_box(xsorted[0], xsorted[-1], ysorted[0], ysorted[-1], lv) for lv in levels]
+    )
 
-    # loop through all AMR grids
-    for state in solution.states:
-        p = state.patch
+    # patches with the same geometry in other frames share the target indices and weights
+    target_key = (method, x.size, y.size, hashlib.blake2b(x.tobytes()+y.tobytes(), digest_size=16).digest())
+
+    for pid in pids:
 
-        # only do subsequent jobs if this is at the target level
-        if p.level != level:
-            continue
+        key = target_key + index.geometry_key(pid)
+        cached = _INTERP_CACHE.get(key)
 
-        # get the indices of the target coordinates that are inside this patch
-        xid = numpy.where(numpy.logical_and(x>=p.lower_global[0], x<=p.upper_global[0]))[0]
-        yid = numpy.where(numpy.logical_and(y>=p.lower_global[1], y<=p.upper_global[1]))[0]
+        if cached is None:
+            # get the indices of the target coordinates that are inside this patch
+            xid = xorder[numpy.searchsorted(xsorted, index.lower[pid, 0], "left"):
+                         numpy.searchsorted(xsorted, index.upper[pid, 0], "right")]
+            yid = yorder[numpy.searchsorted(ysorted, index.lower[pid, 1], "left"):
+                         numpy.searchsorted(ysorted, index.upper[pid, 1], "right")]
+            weights = _patch_weights(index, pid, x[xid], y[yid], method) if xid.size and yid.size else None
+            cached = (xid, yid, x[xid], y[yid], weights)
+            _INTERP_CACHE.put(key, cached)
+
+        xid, yid, xin, yin, weights = cached
 
         # if any target coordinate located in thie patch, do interpolation
         if xid.size and yid.size:
-            # get interpolation object and interpolate
-            interp = get_state_interpolator(state, field)
-            values[yid[:, None], xid[None, :]] = interp(x[xid], y[yid]).T
+            values[:, yid[:, None], xid[None, :]] = _sample_patch(
+                index, pid, fields, xin, yin, method, weights=weights, dry_tol=dry_tol)
+
+    return values[0] if scalar else values
+
+def probe(solution, field, x, y, level=None, method="nearest", dry_tol=1e-4, pids=None):
+    """Sample a field at scattered points, e.g., virtual gauges or transects.
+
+    Args:
+    -----
+        solution: a pyclaw.Solution instance.
+        field: the target field or a list of them; see interpolate.
+        x: 1D numpy.ndarray; x coordinates of the points.
+        y: 1D numpy.ndarray; y coordinates of the points.
+        level: int or None; the target AMR level; None means the finest level
+            covering each point.
+        method: "nearest" (the value of the cell containing a point),
+            "bilinear", or "spline".
+        dry_tol: float; cells shallower than this are dry in derived fields.
+        pids: None, or a 1D int array of the patch containing each point (-1
+            for none), e.g., from PatchIndex.locate_finest, if already known.
+
+    Returns:
+    --------
+        values: a 1D numpy.ndarray of shape (x.size,), or a 2D one of shape
+            (number of fields, x.size) if field is a list; NaN where no patch
+            covers a point.
+    """
 
-    return values
+    if method not in INTERP_METHODS:
+        raise ValueError("Unrecognized method: {}".format(method))
+
+    fields, scalar = resolve_fields(field)
+    x = numpy.asarray(x, dtype=numpy.float64).ravel()
+    y = numpy.asarray(y, dtype=numpy.float64).ravel()
+    values = numpy.full((len(fields), x.size), numpy.nan)
+
+    index = get_patch_index(solution)
+    if pids is None:
+        pids = index.locate_finest(x, y) if level is None else index.locate(x, y, level)
+
+    for pid in numpy.unique(pids[pids >= 0]):
+        ptid = numpy.flatnonzero(pids == pid)
+        values[:, ptid] = _sample_patch(
+            index, pid, fields, x[ptid], y[ptid], method, grid=False, dry_tol=dry_tol)
+
+    return values[0] if scalar else values
+
+def interpolate_at_time(output_dir, t, field, x, y, level=None, method="spline", dry_tol=1e-4):
+    """Interpolate a field at an arbitrary time between output frames.
+
+    The two frames bracketing t are read with framereader (pruned to the
+    target box), interpolated onto the target grid, and blended linearly in
+    time. A time matching a frame reads only that frame.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        t: float; the target time, within the times of the first and the last
+            frames.
+        field, x, y, level, method, dry_tol: see interpolate; level defaults to
+            the composite mode here, as the bracketing frames may be refined
+            differently.
+
+    Returns:
+    --------
+        values: see interpolate.
+    """
+
+    frames = list_frames(output_dir)
+    times = frame_times(output_dir, frames)
+
+    if not frames or t < times[0] or t > times[-1]:
+        raise ValueError("Time {} is outside the frames in {}".format(t, output_dir))
+
+    i = min(int(numpy.searchsorted(times, t, side="right")) - 1, len(frames) - 1)
+    bbox = [numpy.min(x), numpy.min(y), numpy.max(x), numpy.max(y)]
+    values = interpolate(open_frame(output_dir, frames[i], bbox=bbox), field, x, y, level, method, dry_tol)
+
+    if t == times[i]:
+        return values
+
+    weight = (t - times[i]) / (times[i+1] - times[i])
+    upper = interpolate(open_frame(output_dir, frames[i+1], bbox=bbox), field, x, y, level, method, dry_tol)
+    return (1. - weight) * values + weight * upper
+
+def iter_tiles(solution, field, x, y, level=1, method="spline", dry_tol=1e-4, tile=(1024, 1024)):
+    """Interpolate onto a target grid one rectangular tile at a time.
+
+    Each tile goes through interpolate, so only the patches intersecting the
+    tile are visited, and memory use is bounded by the tile size no matter how
+    large the whole target grid is. With a frame opened by framereader with
+    mmap=True, only the pages of the patches a tile touches are read.
+
+    Args:
+    -----
+        solution, field, x, y, level, method, dry_tol: see interpolate; x and y
+            should be sorted so that tiles are compact in space.
+        tile: (number of columns, number of rows); the tile size.
+
+    Yields:
+    -------
+        (row slice, column slice, values); values are what interpolate returns
+        for y[row slice] and x[column slice].
+    """
+    # pylint: disable=too-many-arguments
+
+    ncols, nrows = max(int(tile[0]), 1), max(int(tile[1]), 1)
+
+    for j0 in range(0, len(y), nrows):
+        for i0 in range(0, len(x), ncols):
+            rows, cols = slice(j0, min(j0+nrows, len(y))), slice(i0, min(i0+ncols, len(x)))
+            yield rows, cols, interpolate(solution, field, x[cols], y[rows], level, method, dry_tol)
+
+def interpolate_to_memmap(solution, field, x, y, filepath, level=1, method="spline", dry_tol=1e-4, tile=(1024, 1024)):
+    """Interpolate onto a target grid too large for memory, writing to a .npy file tile by tile.
+
+    Args:
+    -----
+        solution, field, x, y, level, method, dry_tol: see interpolate.
+        filepath: a path-like object; the output .npy file, overwritten if it
+            exists.
+        tile: (number of columns, number of rows); see iter_tiles.
+
+    Returns:
+    --------
+        values: a read-only numpy.memmap of the .npy file, of the shape
+            interpolate would return.
+    """
+    # pylint: disable=too-many-arguments
+
+    fields, scalar = resolve_fields(field)
+    shape = (len(y), len(x)) if scalar else (len(fields), len(y), len(x))
+    values = numpy.lib.format.open_memmap(filepath, mode="w+", dtype=numpy.float64, shape=shape)
+
+    for rows, cols, tile_values in iter_tiles(solution, field, x, y, level, method, dry_tol, tile):
+        values[..., rows, cols] = tile_values
+        values.flush()  # written pages can then be evicted, so resident memory stays bounded
+
+    del values
+    return numpy.load(filepath, mmap_mode="r")
 
 def download_sat_image(extent, filepath, force=False):
     """Download a setellite image of the given extent.
@@ -252,17 +917,9 @@ def get_AMR_borders(solution, lv):
         limits: a list of elements in the format: (xmin, xmax, ymin, ymax)
     """
 
-    limits = []
-    for state in solution.states:
-
-        p = state.patch
-
-        if p.level != lv:
-            continue
-
-        limits.append(
-            [p.lower_global[0], p.upper_global[0],
-             p.lower_global[1], p.upper_global[1]]
-        )
+    index = get_patch_index(solution)
+    ids = index.query_level(lv)
 
-    return limits
+    return numpy.column_stack(
+        (index.lower[ids, 0], index.upper[ids, 0], index.lower[ids, 1], index.upper[ids, 1])
+    ).tolist()
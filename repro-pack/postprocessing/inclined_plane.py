@@ -6,17 +6,13 @@
 #
 # Distributed under terms of the BSD 3-Clause license.
 
-"""Plot figures for silicone oil on an inclined plane of 2.5 degree.
-
-Requires the environment variable PYTHONPATH and CLAW to point to clawpack.
-"""
+"""Plot figures for silicone oil on an inclined plane of 2.5 degree."""
 import os
 import pathlib
 import numpy
 import matplotlib
 from matplotlib import pyplot
-from clawpack import pyclaw
-from helpers import get_max_AMR_level, interpolate
+from helpers import get_max_AMR_level, interpolate, iter_frames
 
 # paths
 root_dir = pathlib.Path(__file__).expanduser().resolve().parents[2]
@@ -65,11 +61,13 @@ cbars_axs = []
 cbars_axs.append(fig.add_subplot(gs[0, 2])) # colorbar for T=32 & 59
 cbars_axs.append(fig.add_subplot(gs[1:, 2])) # colorbar for remaining plots
 
+# frame i+1 is at T[i]; the next frames are read while the current one is plotted
+frames = iter_frames(output_dir, range(1, len(T)+1), prefetch=2)
+
 # T=32 & 59
 # ----------
 for i, t in enumerate([32, 59]):
-    aux = True if output_dir.joinpath("fort.a{:04d}".format(i+1)).is_file() else False
-    soln = pyclaw.Solution(i+1, path=output_dir, file_format="binary", read_aux=aux)
+    _, soln = next(frames)
     maxlv = get_max_AMR_level(soln)
     vals = interpolate(soln, 0, x, y, maxlv)
     vals = numpy.ma.array(vals, mask=(vals<1e-3))
@@ -111,8 +109,7 @@ cbar1.update_ticks()
 for i, t in enumerate([122, 271, 486, 727]):
 
     i += 2 # shift 2 because T=32 and T=59
-    aux = True if output_dir.joinpath("fort.a{:04d}".format(i+1)).is_file() else False
-    soln = pyclaw.Solution(i+1, path=output_dir, file_format="binary", read_aux=aux)
+    _, soln = next(frames)
     maxlv = get_max_AMR_level(soln)
     vals = interpolate(soln, 0, x, y, maxlv)
     vals = numpy.ma.array(vals, mask=(vals<1e-3))
@@ -0,0 +1,67 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Write binary header sidecars for all frames in an _output directory.
+
+The sidecars let framereader skip parsing the ASCII fort.qXXXX headers and
+seek straight to the patches it needs. Frames whose sidecars are missing or
+stale (the source files' mtimes or sizes changed) are indexed in parallel.
+
+Example:
+
+    $ python index_frames.py ../../landspill-runs/utah_maya/_output --nprocs 8
+"""
+import os
+import argparse
+import concurrent.futures
+from framereader import list_frames, read_sidecar, write_sidecar
+
+
+def index_output_dir(output_dir, nprocs=None, force=False, file_prefix="fort"):
+    """Write sidecars for frames that do not have fresh ones.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+        force: bool; rewrite all sidecars even if they are fresh.
+        file_prefix: the prefix of output files.
+
+    Returns:
+    --------
+        A list of the frame numbers that were (re-)indexed.
+    """
+
+    frames = [
+        fno for fno in list_frames(output_dir, file_prefix)
+        if force or read_sidecar(output_dir, fno, file_prefix) is None
+    ]
+
+    with concurrent.futures.ProcessPoolExecutor(nprocs) as executor:
+        list(executor.map(write_sidecar, [output_dir]*len(frames), frames, [file_prefix]*len(frames)))
+
+    return frames
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Index frame headers of GeoClaw binary outputs.")
+    parser.add_argument("output_dir", help="The _output directory of a run.")
+    parser.add_argument("--nprocs", default=None, type=int, help="Number of worker processes.")
+    parser.add_argument("--force", action="store_true", help="Rewrite sidecars even if they are fresh.")
+    parser.add_argument("--prefix", default="fort", help="Prefix of output files.")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(os.path.expanduser(args.output_dir))
+    frames = index_output_dir(output_dir, args.nprocs, args.force, args.prefix)
+    print("Indexed {} frame(s) in {}".format(len(frames), output_dir))
+
+
+if __name__ == "__main__":
+    main()
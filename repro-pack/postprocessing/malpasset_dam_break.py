@@ -9,12 +9,13 @@
 """Post-processing of Malpasset dam break."""
 # pylint: disable=protected-access, too-many-statements
 import pathlib
-import numpy
 from gclandspill import pyclaw
 from gclandspill._postprocessing.plotdepth import plot_topo_on_ax, plot_soln_frame_on_ax
-from gclandspill._postprocessing.calc import get_soln_max
 from gclandspill._misc import import_setrun
 from matplotlib import pyplot, cm
+from reductions import field_stats
+from gauges import load_gauge_store
+from malpasset_metrics import load_observations
 
 # absolute paths
 repo_dir = pathlib.Path(__file__).expanduser().resolve().parents[2]
@@ -134,8 +135,8 @@ def plot_soln(solver="landspill", frame=90):
     rundata = import_setrun(case_dir[solver]).setrun()
     level = rundata.amrdata.amr_levels_max
 
-    # determine cmax
-    cmax = get_soln_max(soln_dir, frame, frame+1, level)
+    # determine cmax (cached on disk, so other figures of this run reuse it)
+    cmax = field_stats(soln_dir, 0, [frame], [level])[level]["max"]
 
     # plot
     fig, axes = pyplot.subplots(2, 1, gridspec_kw={"height_ratios": [20, 1]})
@@ -165,48 +166,24 @@ def plot_gauges():
     """Plot data of gauges."""
     # pylint: disable=invalid-name
 
-    field_gauges = {
-        sol: [pyclaw.GaugeSolution(200+i, str(case_dir[sol].joinpath("_output"))) for i in range(1, 18)]
-        for sol in ["geoclaw", "landspill"]
-    }
-
-    model_gauges = {
-        sol: [pyclaw.GaugeSolution(300+i, str(case_dir[sol].joinpath("_output"))) for i in range(6, 15)]
-        for sol in ["geoclaw", "landspill"]
-    }
+    stores = {sol: load_gauge_store(case_dir[sol].joinpath("_output")) for sol in ["geoclaw", "landspill"]}
+    obs = load_observations()
+    field_ids = obs["field"]["gauges"]
+    model_ids = obs["model"]["gauges"]
 
     # simulation max eta (depth + topo)
-    field_gauge_sim_mx = {sol: [max(pt.q[3]) for pt in field_gauges[sol]] for sol in ["geoclaw", "landspill"]}
-    model_gauge_sim_mx = {sol: [max(pt.q[3]) for pt in model_gauges[sol]] for sol in ["geoclaw", "landspill"]}
+    field_gauge_sim_mx = {sol: stores[sol].max(3, field_ids) for sol in ["geoclaw", "landspill"]}
+    model_gauge_sim_mx = {sol: stores[sol].max(3, model_ids) for sol in ["geoclaw", "landspill"]}
 
     # simulation arrival time (at model gauges)
-    model_gauge_arv_sim = {
-        sol: [pt.t[numpy.where(pt.q[0] > 0)[0][0]] for pt in model_gauges[sol]]
-        for sol in ["geoclaw", "landspill"]
-    }
-
-    # field survey observed eta
-    field_gauge_obs_mx = [
-        79.15, 87.2, 54.9, 64.7, 51.1, 43.75, 44.35, 38.6,
-        31.9, 40.75, 24.15, 24.9, 17.25, 20.7, 18.6, 17.25,
-        14
-    ]
+    model_gauge_arv_sim = {sol: stores[sol].arrival(0, 0., model_ids) for sol in ["geoclaw", "landspill"]}
 
-    # field survey max eta from George, 2011
-    field_gauge_george_mx = [
-        84.56, 87.029, 55.453, 58.175, 48.559, 48.351, 42.064, 36.863,
-        34.121, 40.172, 25.962, 27.164, 22.216, 21.827, 19.484, 19.89,
-        16.679
-    ]
-
-    # lab experiment observed eta
-    model_gauge_obs_mx = [84.2, 49.1, 54, 40.2, 34.9, 27.4, 21.5, 16.1, 12.9]
-
-    # lab experiment max eta from George, 2011
-    model_gauge_george_mx = [85.653, 56.364, 53.304, 48.762, 38.684, 26.616, 20.445, 18.218, 13.169]
-
-    # lab experiment arrival times
-    model_gauge_arv_exp = [10.2, 102, 182, 263, 404, 600, 845, 972, 1139]
+    # observations (Biscarini et al., 2016) and George (2011)'s results
+    field_gauge_obs_mx = obs["field"]["max_eta"]
+    field_gauge_george_mx = obs["field"]["george_max_eta"]
+    model_gauge_obs_mx = obs["model"]["max_eta"]
+    model_gauge_george_mx = obs["model"]["george_max_eta"]
+    model_gauge_arv_exp = obs["model"]["arrival_time"]
 
     # plot max eta of police servey points
     fig, axes = pyplot.subplots(1, 1)
@@ -292,20 +269,23 @@ def plot_gauges():
     # plot histories of P2 and S11
     fig, axes = pyplot.subplots(1, 1)
     fig.suptitle("Malpasset dam break:\nwater surface level history at gauge P2 and S11")
+    histories = {
+        (sol, gid): stores[sol].series(gid) for sol in ["geoclaw", "landspill"] for gid in [202, 311]
+    }
     axes.plot(
-        field_gauges["geoclaw"][1].t, field_gauges["geoclaw"][1].q[3], ls="solid", lw=3,
+        histories["geoclaw", 202][0], histories["geoclaw", 202][1][3], ls="solid", lw=3,
         label="Gauge P2, GeoClaw (v5.7.1)"
     )
     axes.plot(
-        field_gauges["landspill"][1].t, field_gauges["landspill"][1].q[3], ls="dashdot", lw=1.5, alpha=0.8,
+        histories["landspill", 202][0], histories["landspill", 202][1][3], ls="dashdot", lw=1.5, alpha=0.8,
         label="Gauge P2, GeoClaw-landspill"
     )
     axes.plot(
-        model_gauges["geoclaw"][5].t, model_gauges["geoclaw"][5].q[3], ls="dashed", lw=3,
+        histories["geoclaw", 311][0], histories["geoclaw", 311][1][3], ls="dashed", lw=3,
         label="Gauge S11, GeoClaw (v5.7.1)"
     )
     axes.plot(
-        model_gauges["landspill"][5].t, model_gauges["landspill"][5].q[3], ls="dotted", lw=1.5, alpha=0.8,
+        histories["landspill", 311][0], histories["landspill", 311][1][3], ls="dotted", lw=1.5, alpha=0.8,
         label="Gauge S11, GeoClaw-landspill"
     )
     axes.set_xlabel("T (seconds)")
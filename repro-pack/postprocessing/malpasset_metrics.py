@@ -0,0 +1,194 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Validation metrics of Malpasset dam-break runs against observations.
+
+Observations (Biscarini et al., 2016) and George (2011)'s results come from
+the CSV files in `malpasset-dam-break-landspill/data`. Simulated values come
+from the gauge stores of any number of runs (see gauges.py) and form a
+runs x gauges matrix per gauge group, so RMSE, bias, and max absolute error
+of all runs are single array operations. Gauge group "field" holds the police
+survey points P1-P17 (gauges 201-217), and "model" the scaled-model points
+S6-S14 (gauges 306-314).
+
+Example (ranks runs of a Manning-coefficient sweep by the RMSE of max eta):
+
+    $ python malpasset_metrics.py ../runs/malpasset-dam-break-* ../../sweeps/malpasset-n*
+"""
+import os
+import pathlib
+import argparse
+import concurrent.futures
+import numpy
+from gauges import load_gauge_store
+from reductions import save_table
+
+# observation data
+data_dir = pathlib.Path(__file__).expanduser().resolve().parents[1].joinpath(
+    "runs", "malpasset-dam-break-landspill", "data")
+
+# gauge groups: (gauge ID offset, CSV of observations, CSV of George 2011's results)
+GROUPS = {
+    "field": (200, "field_pts_biscarini_2016.csv", "field_pts_george_2011.csv"),
+    "model": (300, "model_pts_biscarini_2016.csv", "model_pts_george_2011.csv"),
+}
+
+# one row per run per gauge group per quantity
+METRICS_DTYPE = numpy.dtype([
+    ("run", "U256"), ("group", "U8"), ("quantity", "U16"), ("ngauges", numpy.int64),
+    ("rmse", numpy.float64), ("bias", numpy.float64), ("max_abs_err", numpy.float64),
+])
+
+
+def load_observations(data_dir=data_dir):
+    """Load observed and George (2011)'s values of each gauge group.
+
+    Returns:
+    --------
+        A dictionary; {group: {"gauges": 1D int array of gauge IDs, "max_eta":
+        observed values, "george_max_eta": George (2011)'s values, and, if
+        observed, "arrival_time"}}.
+    """
+
+    obs = {}
+    for group, (offset, obs_file, george_file) in GROUPS.items():
+        with open(os.path.join(data_dir, obs_file), "r") as fileobj:
+            names = fileobj.readline().lstrip("#").strip().split(",")
+
+        table = numpy.loadtxt(os.path.join(data_dir, obs_file), delimiter=",", ndmin=2)
+        george = numpy.loadtxt(os.path.join(data_dir, george_file), delimiter=",", ndmin=2)
+
+        if not numpy.array_equal(table[:, 0], george[:, 0]):
+            raise ValueError("Points of {} and {} differ".format(obs_file, george_file))
+
+        obs[group] = {name: table[:, i] for i, name in enumerate(names) if name != "id"}
+        obs[group]["gauges"] = table[:, 0].astype(numpy.int64) + offset
+        obs[group]["george_max_eta"] = george[:, 1]
+
+    return obs
+
+
+def _run_values(output_dir, obs):
+    """Get {group: (max eta, arrival time)} of one run at the observed gauges."""
+
+    store = load_gauge_store(output_dir)
+    return {
+        group: (store.max(3, val["gauges"]), store.arrival(0, 0., val["gauges"]))
+        for group, val in obs.items()
+    }
+
+
+def simulated_matrices(output_dirs, obs, nprocs=None):
+    """Get runs x gauges matrices of simulated max eta and arrival times.
+
+    Args:
+    -----
+        output_dirs: a list of the _output directories of runs.
+        obs: a dictionary from load_observations.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+
+    Returns:
+    --------
+        A dictionary; {group: {"max_eta": 2D array, "arrival_time": 2D array}}
+        with one row per run and one column per gauge of the group.
+    """
+
+    with concurrent.futures.ProcessPoolExecutor(nprocs) as executor:
+        results = list(executor.map(_run_values, output_dirs, [obs]*len(output_dirs)))
+
+    return {
+        group: {
+            "max_eta": numpy.array([res[group][0] for res in results]).reshape(len(output_dirs), -1),
+            "arrival_time": numpy.array([res[group][1] for res in results]).reshape(len(output_dirs), -1),
+        } for group in obs
+    }
+
+
+def error_metrics(sim, obs):
+    """Get RMSE, bias, and max absolute error of every row of a runs x gauges matrix.
+
+    Gauges with NaN on either side (e.g., never wet) are skipped.
+
+    Returns:
+    --------
+        ngauges, rmse, bias, max_abs_err: 1D numpy.ndarray, one value per run.
+    """
+
+    err = numpy.atleast_2d(sim) - obs[None, :]
+    valid = numpy.isfinite(err)
+    ngauges = valid.sum(axis=1)
+    err = numpy.where(valid, err, 0.)
+
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        rmse = numpy.sqrt((err**2).sum(axis=1) / ngauges)
+        bias = err.sum(axis=1) / ngauges
+
+    return ngauges, rmse, bias, numpy.where(ngauges > 0, numpy.abs(err).max(axis=1, initial=0.), numpy.nan)
+
+
+def run_metrics(output_dirs, obs=None, nprocs=None, reference=True):
+    """Get the validation metrics of runs.
+
+    Args:
+    -----
+        output_dirs: a list of the _output directories of runs.
+        obs: a dictionary from load_observations; None means the data in the repo.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+        reference: bool; also score George (2011)'s max eta, as run "george_2011".
+
+    Returns:
+    --------
+        A structured numpy.ndarray of METRICS_DTYPE.
+    """
+
+    obs = load_observations() if obs is None else obs
+    sims = simulated_matrices(output_dirs, obs, nprocs)
+    rows = []
+
+    for group, val in obs.items():
+        for quantity in ["max_eta", "arrival_time"]:
+            if quantity not in val:
+                continue
+
+            runs, sim = list(map(str, output_dirs)), sims[group][quantity]
+            if reference and quantity == "max_eta":
+                runs, sim = runs + ["george_2011"], numpy.vstack((sim, val["george_max_eta"]))
+
+            block = numpy.zeros(len(runs), dtype=METRICS_DTYPE)
+            block["run"], block["group"], block["quantity"] = runs, group, quantity
+            block["ngauges"], block["rmse"], block["bias"], block["max_abs_err"] = error_metrics(sim, val[quantity])
+            rows.append(block)
+
+    return numpy.concatenate([numpy.zeros(0, dtype=METRICS_DTYPE)] + rows)
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Validation metrics of Malpasset dam-break runs.")
+    parser.add_argument("runs", nargs="+", help="Case folders (with _output) or _output directories.")
+    parser.add_argument("--data", default=str(data_dir), help="Folder of the observation CSV files.")
+    parser.add_argument("--nprocs", default=None, type=int, help="Number of worker processes.")
+    parser.add_argument("--out", default="malpasset-metrics.csv", help="Output CSV.")
+    args = parser.parse_args()
+
+    output_dirs = []
+    for run in args.runs:
+        run = os.path.abspath(os.path.expanduser(run))
+        output_dirs.append(os.path.join(run, "_output") if os.path.isdir(os.path.join(run, "_output")) else run)
+
+    table = run_metrics(output_dirs, load_observations(args.data), args.nprocs)
+    save_table(args.out, table)
+
+    for row in numpy.sort(table, order=["group", "quantity", "rmse"]):
+        print("{:5s} {:12s} rmse {:10.4f} bias {:10.4f} max {:10.4f}  {}".format(
+            row["group"], row["quantity"], row["rmse"], row["bias"], row["max_abs_err"], row["run"]))
+
+
+if __name__ == "__main__":
+    main()
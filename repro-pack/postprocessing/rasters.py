@@ -0,0 +1,304 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Whole-run raster products on a fixed target grid.
+
+Frames are streamed through helpers.interpolate (composite finest-level mode)
+onto a target raster, usually aligned with the topography file of a case.
+Frames are split into chunks processed in parallel; each worker holds only its
+running result and the frame being processed. A single frame can also be
+written tile by tile, for targets (e.g., the whole Malpasset domain at the
+finest resolution) too large to hold in memory.
+
+Examples (maximum depth envelope, and arrival time and inundation duration, of
+the flat-terrain Maya crude case):
+
+    $ python rasters.py envelope ../../landspill-runs/utah_maya/_output \\
+        --topo ../../landspill-runs/common-files/salt_lake_1.asc \\
+        --bbox -12459900 4985870 -12459400 4986080 --out maya-max-depth.tif
+    $ python rasters.py arrival ../../landspill-runs/utah_maya/_output \\
+        --topo ../../landspill-runs/common-files/salt_lake_1.asc \\
+        --bbox -12459900 4985870 -12459400 4986080 --out maya-arrival.tif
+    $ python rasters.py frame ../../landspill-runs/utah_maya/_output 100 \\
+        --topo ../../landspill-runs/common-files/salt_lake_1.asc --out maya-depth-0100.tif
+"""
+import os
+import argparse
+import concurrent.futures
+import numpy
+import rasterio
+from framereader import frame_times, list_frames, open_frame
+from helpers import interpolate, iter_tiles
+
+
+def topo_aligned_grid(topo_path, bbox=None):
+    """Get cell-center coordinates of a topography raster, optionally cropped.
+
+    Args:
+    -----
+        topo_path: a path-like object; a raster file readable by rasterio.
+        bbox: None or [xmin, ymin, xmax, ymax]; the cells covering it are kept.
+
+    Returns:
+    --------
+        x: 1D numpy.ndarray; ascending x coordinates of cell centers.
+        y: 1D numpy.ndarray; ascending y coordinates of cell centers.
+        crs: the coordinate reference system of the raster (may be None).
+    """
+
+    with rasterio.open(topo_path) as raster:
+        transform, crs, width, height = raster.transform, raster.crs, raster.width, raster.height
+
+    dx, dy = transform.a, -transform.e
+    col0, col1, row0, row1 = 0, width, 0, height
+
+    if bbox is not None:
+        col0 = max(int(numpy.floor((bbox[0]-transform.c)/dx)), 0)
+        col1 = min(int(numpy.ceil((bbox[2]-transform.c)/dx)), width)
+        row0 = max(int(numpy.floor((transform.f-bbox[3])/dy)), 0)
+        row1 = min(int(numpy.ceil((transform.f-bbox[1])/dy)), height)
+
+    x = transform.c + (numpy.arange(col0, col1) + 0.5) * dx
+    y = transform.f - (numpy.arange(row0, row1) + 0.5) * dy
+
+    return x, y[::-1], crs
+
+
+def write_geotiff(filepath, values, x, y, crs=None, nodata=None):
+    """Write a raster on a uniform grid to a GeoTIFF.
+
+    Args:
+    -----
+        filepath: a path-like object.
+        values: a 2D numpy.ndarray of shape (y.size, x.size), or a 3D one of
+            shape (bands, y.size, x.size), with ascending y.
+        x, y: 1D numpy.ndarray; ascending, uniformly spaced cell centers.
+        crs: the coordinate reference system, e.g., from topo_aligned_grid.
+        nodata: the nodata value, if any.
+    """
+
+    values = values[None, ...] if values.ndim == 2 else values
+
+    with rasterio.open(
+        filepath, "w", driver="GTiff", width=x.size, height=y.size, count=values.shape[0],
+        dtype=values.dtype, crs=crs, transform=_transform(x, y), nodata=nodata
+    ) as raster:
+        raster.write(values[:, ::-1, :])  # rows of a GeoTIFF go from north to south
+
+
+def write_geotiff_tiled(filepath, solution, field, x, y, crs=None, method="nearest", tile=(1024, 1024)):
+    """Interpolate a frame onto a uniform grid and write it to a GeoTIFF tile by tile.
+
+    The full raster is never held in memory: each tile is interpolated with
+    helpers.iter_tiles (visiting only the patches intersecting it) and written
+    to its window of a tiled GeoTIFF right away.
+
+    Args:
+    -----
+        filepath: a path-like object.
+        solution: a framereader.Frame, preferably opened with mmap=True.
+        field: the target field or a list of them (one band each); see
+            helpers.interpolate.
+        x, y: 1D numpy.ndarray; ascending, uniformly spaced cell centers.
+        crs: the coordinate reference system, e.g., from topo_aligned_grid.
+        method: the interpolation engine; see helpers.interpolate.
+        tile: (number of columns, number of rows); multiples of 16, as required
+            by GeoTIFF tiles.
+    """
+    # pylint: disable=too-many-arguments
+
+    count = 1 if isinstance(field, (int, numpy.integer, str)) or callable(field) else len(field)
+
+    with rasterio.open(
+        filepath, "w", driver="GTiff", width=x.size, height=y.size, count=count, dtype=numpy.float64,
+        crs=crs, transform=_transform(x, y), tiled=True, blockxsize=tile[0], blockysize=tile[1]
+    ) as raster:
+        for rows, cols, values in iter_tiles(solution, field, x, y, None, method, tile=tile):
+            values = values[None, ...] if values.ndim == 2 else values
+            window = rasterio.windows.Window(cols.start, y.size-rows.stop, cols.stop-cols.start, rows.stop-rows.start)
+            raster.write(values[:, ::-1, :], window=window)
+
+
+def _transform(x, y):
+    """The affine transform of a raster with ascending, uniformly spaced cell centers x and y."""
+    dx = (x[-1] - x[0]) / max(x.size-1, 1)
+    dy = (y[-1] - y[0]) / max(y.size-1, 1)
+    return rasterio.transform.from_origin(x[0]-dx/2., y[-1]+dy/2., dx, dy)
+
+
+def _bbox(x, y):
+    """The bounding box [xmin, ymin, xmax, ymax] of target coordinates."""
+    return [x.min(), y.min(), x.max(), y.max()]
+
+
+def _chunks(frames, nchunks):
+    """Split a list of frames into at most nchunks contiguous chunks."""
+    return [chunk.tolist() for chunk in numpy.array_split(numpy.asarray(frames), nchunks) if chunk.size]
+
+
+def _envelope_chunk(output_dir, frames, field, x, y, method):
+    """Running max of a field over a chunk of frames."""
+
+    envelope = numpy.full((y.size, x.size), -numpy.inf)
+    for fno in frames:
+        soln = open_frame(output_dir, fno, bbox=_bbox(x, y))
+        numpy.fmax(envelope, interpolate(soln, field, x, y, None, method), out=envelope)
+
+    return envelope
+
+
+def max_envelope(output_dir, x, y, field=0, frames=None, method="nearest", nprocs=None):
+    """Get the maximum of a field over all frames of a run at every target point.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        x, y: 1D numpy.ndarray; target coordinates.
+        field: the target field; see helpers.interpolate.
+        frames: an iterable of frame numbers; None means all frames.
+        method: the interpolation engine; see helpers.interpolate.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+
+    Returns:
+    --------
+        envelope: a 2D numpy.ndarray of shape (y.size, x.size); zero where no
+            frame covers a point.
+    """
+
+    frames = list_frames(output_dir) if frames is None else list(frames)
+    chunks = _chunks(frames, nprocs or os.cpu_count() or 1)
+    envelope = numpy.full((y.size, x.size), -numpy.inf)
+
+    # start from -inf so fields that can be negative (e.g., hu and hv) are not clamped at zero; fmax keeps NaN
+    # from spreading
+    with concurrent.futures.ProcessPoolExecutor(nprocs) as executor:
+        futures = [executor.submit(_envelope_chunk, output_dir, chunk, field, x, y, method) for chunk in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            numpy.fmax(envelope, future.result(), out=envelope)
+
+    envelope[numpy.isnan(envelope) | (envelope == -numpy.inf)] = 0.
+    return envelope
+
+
+def _arrival_chunk(output_dir, frames, times, weights, x, y, tol, method):
+    """First wet time and total wet time over a chunk of frames."""
+
+    arrival = numpy.full((y.size, x.size), numpy.nan)
+    duration = numpy.zeros((y.size, x.size), dtype=numpy.float64)
+
+    for fno, t, weight in zip(frames, times, weights):
+        soln = open_frame(output_dir, fno, bbox=_bbox(x, y))
+        wet = interpolate(soln, 0, x, y, None, method) > tol
+        arrival[wet & numpy.isnan(arrival)] = t
+        duration[wet] += weight
+
+    return arrival, duration
+
+
+def arrival_duration(output_dir, x, y, tol=1e-4, frames=None, method="nearest", nprocs=None):
+    """Get the arrival time and the inundation duration at every target point.
+
+    A point is wet in a frame if its depth exceeds `tol`. The arrival time is
+    the time of the first frame in which a point is wet. The duration sums, over
+    the frames in which a point is wet, the time each frame represents (half of
+    the intervals to its neighbouring frames).
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        x, y: 1D numpy.ndarray; target coordinates.
+        tol: float; the depth threshold of wet points.
+        frames: an iterable of frame numbers; None means all frames.
+        method: the interpolation engine; see helpers.interpolate.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+
+    Returns:
+    --------
+        arrival: a 2D numpy.ndarray of shape (y.size, x.size); NaN where a
+            point is never wet.
+        duration: a 2D numpy.ndarray of shape (y.size, x.size).
+    """
+
+    frames = list_frames(output_dir) if frames is None else sorted(frames)
+    times = frame_times(output_dir, frames)
+    weights = numpy.diff(times, prepend=times[:1], append=times[-1:]) if times.size else times
+    weights = (weights[:-1] + weights[1:]) / 2.
+
+    arrival = numpy.full((y.size, x.size), numpy.nan)
+    duration = numpy.zeros((y.size, x.size), dtype=numpy.float64)
+
+    with concurrent.futures.ProcessPoolExecutor(nprocs) as executor:
+        futures = []
+        for chunk in numpy.array_split(numpy.arange(len(frames)), nprocs or os.cpu_count() or 1):
+            if chunk.size:
+                futures.append(executor.submit(
+                    _arrival_chunk, output_dir, [frames[i] for i in chunk], times[chunk], weights[chunk],
+                    x, y, tol, method
+                ))
+
+        for future in concurrent.futures.as_completed(futures):
+            chunk_arrival, chunk_duration = future.result()
+            numpy.fmin(arrival, chunk_arrival, out=arrival)
+            duration += chunk_duration
+
+    return arrival, duration
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Whole-run raster products of GeoClaw outputs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    envelope = subparsers.add_parser("envelope", help="Max-value envelope of a field over all frames.")
+    envelope.add_argument("output_dir", help="The _output directory of a run.")
+    envelope.add_argument("--topo", required=True, help="Topography raster defining the target grid.")
+    envelope.add_argument("--bbox", default=None, type=float, nargs=4, help="xmin ymin xmax ymax of target.")
+    envelope.add_argument("--field", default="depth", help="Field index or name.")
+    envelope.add_argument("--method", default="nearest", help="Interpolation engine.")
+    envelope.add_argument("--nprocs", default=None, type=int, help="Number of worker processes.")
+    envelope.add_argument("--out", required=True, help="Output GeoTIFF.")
+
+    arrival = subparsers.add_parser("arrival", help="Arrival time (band 1) and inundation duration (band 2).")
+    arrival.add_argument("output_dir", help="The _output directory of a run.")
+    arrival.add_argument("--topo", required=True, help="Topography raster defining the target grid.")
+    arrival.add_argument("--bbox", default=None, type=float, nargs=4, help="xmin ymin xmax ymax of target.")
+    arrival.add_argument("--tol", default=1e-4, type=float, help="Depth threshold of wet points.")
+    arrival.add_argument("--method", default="nearest", help="Interpolation engine.")
+    arrival.add_argument("--nprocs", default=None, type=int, help="Number of worker processes.")
+    arrival.add_argument("--out", required=True, help="Output GeoTIFF.")
+
+    frame = subparsers.add_parser("frame", help="A field of one frame, written tile by tile (out of core).")
+    frame.add_argument("output_dir", help="The _output directory of a run.")
+    frame.add_argument("frame", type=int, help="Frame number.")
+    frame.add_argument("--topo", required=True, help="Topography raster defining the target grid.")
+    frame.add_argument("--bbox", default=None, type=float, nargs=4, help="xmin ymin xmax ymax of target.")
+    frame.add_argument("--field", default="depth", help="Field index or name.")
+    frame.add_argument("--method", default="nearest", help="Interpolation engine.")
+    frame.add_argument("--tile", default=[1024, 1024], type=int, nargs=2, help="Columns and rows of a tile.")
+    frame.add_argument("--out", required=True, help="Output GeoTIFF.")
+
+    args = parser.parse_args()
+    output_dir = os.path.abspath(os.path.expanduser(args.output_dir))
+    x, y, crs = topo_aligned_grid(args.topo, args.bbox)
+
+    if args.command == "envelope":
+        field = int(args.field) if args.field.isdigit() else args.field
+        values = max_envelope(output_dir, x, y, field, method=args.method, nprocs=args.nprocs)
+        write_geotiff(args.out, values, x, y, crs)
+    elif args.command == "arrival":
+        values = arrival_duration(output_dir, x, y, args.tol, method=args.method, nprocs=args.nprocs)
+        write_geotiff(args.out, numpy.stack(values), x, y, crs, nodata=numpy.nan)
+    elif args.command == "frame":
+        field = int(args.field) if args.field.isdigit() else args.field
+        soln = open_frame(output_dir, args.frame, bbox=_bbox(x, y))  # memory-mapped; pages are read on demand
+        write_geotiff_tiled(args.out, soln, field, x, y, crs, args.method, args.tile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Run-wide reductions over all frames of an _output directory.
+
+Frames are read with framereader and reduced independently on a process pool,
+so no pyclaw.Solution is ever built.
+
+Examples (results go to the output directory):
+
+    $ python reductions.py volumes ../../landspill-runs/utah_maya/_output
+    $ python reductions.py stats ../../landspill-runs/utah_maya/_output --field 0 --percentiles 50 99
+"""
+import os
+import json
+import hashlib
+import argparse
+import concurrent.futures
+import numpy
+from framereader import list_frames, open_frame
+from helpers import resolve_fields
+
+# one row per frame per AMR level
+VOLUME_DTYPE = numpy.dtype([
+    ("frame", numpy.int64), ("t", numpy.float64), ("level", numpy.int64),
+    ("ncells", numpy.int64), ("nwet", numpy.int64), ("volume", numpy.float64),
+])
+
+
+def frame_level_volumes(output_dir, frame, dry_tol=1e-4):
+    """Get level-wise numbers of cells, wet cells, and fluid volumes of one frame.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        frame: int; the frame number.
+        dry_tol: float; cells deeper than this are wet.
+
+    Returns:
+    --------
+        A structured numpy.ndarray of VOLUME_DTYPE, one row per AMR level.
+    """
+
+    soln = open_frame(output_dir, frame)
+    patches = soln.patches
+
+    depth_sums = numpy.array([state.q[0].sum() for state in soln.states])
+    wet_counts = numpy.array([numpy.count_nonzero(state.q[0] > dry_tol) for state in soln.states])
+
+    levels, inverse = numpy.unique(patches["level"], return_inverse=True)
+    rows = numpy.zeros(levels.size, dtype=VOLUME_DTYPE)
+    rows["frame"] = frame
+    rows["t"] = soln.t
+    rows["level"] = levels
+    rows["ncells"] = numpy.bincount(inverse, patches["nx"].astype(numpy.int64) * patches["ny"])
+    rows["nwet"] = numpy.bincount(inverse, wet_counts)
+    rows["volume"] = numpy.bincount(inverse, depth_sums * patches["dx"] * patches["dy"])
+
+    return rows
+
+
+def level_volume_series(output_dir, frames=None, dry_tol=1e-4, nprocs=None):
+    """Get the time series of level-wise cell counts and fluid volumes of a run.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        frames: an iterable of frame numbers; None means all frames.
+        dry_tol: float; cells deeper than this are wet.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+
+    Returns:
+    --------
+        A structured numpy.ndarray of VOLUME_DTYPE sorted by frame and level.
+    """
+
+    frames = list_frames(output_dir) if frames is None else list(frames)
+
+    with concurrent.futures.ProcessPoolExecutor(nprocs) as executor:
+        rows = list(executor.map(
+            frame_level_volumes, [output_dir]*len(frames), frames, [dry_tol]*len(frames),
+            chunksize=max(1, len(frames)//(4*(nprocs or os.cpu_count() or 1)))
+        ))
+
+    return numpy.concatenate([numpy.zeros(0, dtype=VOLUME_DTYPE)] + rows)
+
+
+def _patch_values(output_dir, frame, field, levels, dry_tol):
+    """Get (AMR level, 1D array of values) of a field on each patch of a frame.
+
+    Only wet cells count if dry_tol is not None.
+    """
+
+    fld = resolve_fields(field)[0][0]
+    soln = open_frame(output_dir, frame, levels=None if levels is None else (min(levels), max(levels)))
+
+    for state in soln.states:
+        if levels is not None and state.patch.level not in levels:
+            continue
+        values = state.q[fld] if isinstance(fld, int) else fld(state.q, 1e-4 if dry_tol is None else dry_tol)
+        yield state.patch.level, (values if dry_tol is None else values[state.q[0] > dry_tol]).ravel()
+
+
+def _frame_min_max(output_dir, frame, field, levels, dry_tol):
+    """Get {level: [min, max, count]} of a field in a frame; key "all" is across levels."""
+
+    result = {}
+    for level, values in _patch_values(output_dir, frame, field, levels, dry_tol):
+        if not values.size:
+            continue
+        for key in (level, "all"):
+            old = result.get(key, [numpy.inf, -numpy.inf, 0])
+            result[key] = [min(old[0], values.min()), max(old[1], values.max()), old[2] + values.size]
+
+    return result
+
+
+def _frame_histograms(output_dir, frame, field, levels, dry_tol, ranges, nbins):
+    """Get {level: histogram counts} of a field in a frame over the given {level: (min, max)}."""
+
+    result = {key: numpy.zeros(nbins, dtype=numpy.int64) for key in ranges}
+    for level, values in _patch_values(output_dir, frame, field, levels, dry_tol):
+        if not values.size:
+            continue
+        for key in (level, "all"):
+            if key in ranges:  # levels with no values in any frame have no range
+                result[key] += numpy.histogram(values, nbins, ranges[key])[0]
+
+    return result
+
+
+def _percentiles(counts, vrange, percentiles):
+    """Get percentiles from a histogram; linear within bins."""
+
+    cumsum = numpy.cumsum(counts)
+    targets = numpy.asarray(percentiles, dtype=numpy.float64) / 100. * cumsum[-1]
+    bins = numpy.minimum(numpy.searchsorted(cumsum, targets), counts.size-1)
+    before = numpy.where(bins > 0, cumsum[bins-1], 0)
+    frac = numpy.clip((targets - before) / numpy.maximum(counts[bins], 1), 0., 1.)
+    width = (vrange[1] - vrange[0]) / counts.size
+
+    return (vrange[0] + (bins + frac) * width).tolist()
+
+
+def field_stats(
+    output_dir, field=0, frames=None, levels=None, percentiles=(),
+    dry_tol=None, nbins=4096, nprocs=None, cache=True
+):
+    """Get the min, max, and percentiles of a field over a range of frames.
+
+    Frames are reduced in parallel. Min and max are exact. Percentiles come
+    from a second pass that bins values into `nbins` bins over the global
+    range, so they are accurate to (max-min)/nbins.
+
+    Results are cached in `<output_dir>/field_stats.json`, keyed by the
+    arguments and the mtimes and sizes of the frames' fort.bXXXX, so colour
+    scales for all figures of a run come from one pass.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        field: the target field; an int or a name in helpers.FIELDS or
+            helpers.DERIVED_FIELDS.
+        frames: an iterable of frame numbers; None means all frames.
+        levels: an iterable of AMR levels; None means all levels.
+        percentiles: a sequence of percentiles in [0, 100].
+        dry_tol: None to use all cells, or a float to use only cells deeper
+            than it.
+        nbins: int; the number of histogram bins for percentiles.
+        nprocs: int or None; the number of worker processes (None: CPU count).
+        cache: bool; whether to read and write the on-disk cache.
+
+    Returns:
+    --------
+        stats: a dictionary; the keys are AMR levels and "all" (across levels),
+            and the values are dictionaries of "min", "max", "count", and
+            "percentiles" (a list in the order of the argument).
+    """
+
+    frames = list_frames(output_dir) if frames is None else sorted(frames)
+    levels = None if levels is None else sorted(int(lv) for lv in levels)
+    percentiles = [float(pct) for pct in percentiles]
+
+    # the cache key includes the state of the data files so stale results are never used
+    bstats = [
+        (lambda st: [st.st_mtime_ns, st.st_size])(os.stat(os.path.join(output_dir, "fort.b{:04d}".format(fno))))
+        for fno in frames
+    ]
+    key = hashlib.sha1(json.dumps(
+        [field, frames, levels, percentiles, dry_tol, nbins, bstats]).encode()).hexdigest()
+    cache_file = os.path.join(output_dir, "field_stats.json")
+
+    cached = {}
+    if cache and os.path.isfile(cache_file):
+        with open(cache_file, "r") as fileobj:
+            cached = json.load(fileobj)
+        if key in cached:
+            return {(k if k == "all" else int(k)): v for k, v in cached[key].items()}
+
+    nframes = len(frames)
+    args = [[output_dir]*nframes, frames, [field]*nframes, [levels]*nframes, [dry_tol]*nframes]
+
+    with concurrent.futures.ProcessPoolExecutor(nprocs) as executor:
+        stats = {}
+        for result in executor.map(_frame_min_max, *args):
+            for lv, (vmin, vmax, count) in result.items():
+                old = stats.get(lv, {"min": numpy.inf, "max": -numpy.inf, "count": 0})
+                stats[lv] = {
+                    "min": float(min(old["min"], vmin)), "max": float(max(old["max"], vmax)),
+                    "count": int(old["count"] + count)
+                }
+
+        # second pass for percentiles
+        hists = {lv: numpy.zeros(nbins, dtype=numpy.int64) for lv in stats}
+        if percentiles:
+            ranges = {lv: (val["min"], val["max"]) for lv, val in stats.items()}
+            for result in executor.map(
+                    _frame_histograms, *args, [ranges]*nframes, [nbins]*nframes):
+                for lv, counts in result.items():
+                    hists[lv] += counts
+
+    for lv, val in stats.items():
+        val["percentiles"] = _percentiles(hists[lv], (val["min"], val["max"]), percentiles) if percentiles else []
+
+    if cache:
+        cached[key] = {str(k): v for k, v in stats.items()}
+        with open(cache_file, "w") as fileobj:
+            json.dump(cached, fileobj)
+
+    return stats
+
+
+def save_table(filepath, table):
+    """Save a structured array as a CSV file with a header line of field names."""
+
+    kinds = {"i": "%d", "u": "%d", "U": "%s", "S": "%s"}
+    fmts = [kinds.get(table.dtype[name].kind, "%.15e") for name in table.dtype.names]
+    numpy.savetxt(filepath, table, fmt=fmts, delimiter=",", header=",".join(table.dtype.names))
+
+
+def load_table(filepath, dtype):
+    """Load a CSV file written by save_table into a structured array."""
+    return numpy.atleast_1d(numpy.loadtxt(filepath, dtype=dtype, delimiter=","))
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Run-wide reductions of GeoClaw outputs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    volumes = subparsers.add_parser("volumes", help="Level-wise cell counts and fluid volumes of all frames.")
+    volumes.add_argument("output_dir", help="The _output directory of a run.")
+    volumes.add_argument("--dry-tol", default=1e-4, type=float, help="Dry tolerance.")
+    volumes.add_argument("--nprocs", default=None, type=int, help="Number of worker processes.")
+    volumes.add_argument("--out", default=None, help="Output CSV (default: <output_dir>/level_volumes.csv).")
+
+    stats = subparsers.add_parser("stats", help="Min, max, and percentiles of a field over frames.")
+    stats.add_argument("output_dir", help="The _output directory of a run.")
+    stats.add_argument("--field", default="0", help="Field index or name (e.g., depth, speed).")
+    stats.add_argument("--frames", default=None, type=int, nargs="+", help="Frame numbers (default: all).")
+    stats.add_argument("--levels", default=None, type=int, nargs="+", help="AMR levels (default: all).")
+    stats.add_argument("--percentiles", default=[], type=float, nargs="+", help="Percentiles in [0, 100].")
+    stats.add_argument("--dry-tol", default=None, type=float, help="Only count cells deeper than this.")
+    stats.add_argument("--nprocs", default=None, type=int, help="Number of worker processes.")
+
+    args = parser.parse_args()
+    output_dir = os.path.abspath(os.path.expanduser(args.output_dir))
+
+    if args.command == "volumes":
+        table = level_volume_series(output_dir, dry_tol=args.dry_tol, nprocs=args.nprocs)
+        save_table(args.out or os.path.join(output_dir, "level_volumes.csv"), table)
+    elif args.command == "stats":
+        field = int(args.field) if args.field.isdigit() else args.field
+        result = field_stats(
+            output_dir, field, args.frames, args.levels, args.percentiles, args.dry_tol, nprocs=args.nprocs)
+        for key in sorted(result, key=str):
+            print("level {}: {}".format(key, result[key]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Incremental reading of the _output directory of a running simulation.
+
+OutputTail remembers how far it has read each gauge file and the last frame it
+has seen, so every poll returns only new gauge rows and new frames. LiveRun
+builds on it to keep volumes, the max-depth envelope, footprint statistics,
+and gauge maxima up to date without re-reading frames from the beginning.
+
+Example (print progress of the flat-terrain Maya crude case every minute):
+
+    $ python tail.py ../../landspill-runs/utah_maya/_output --interval 60
+"""
+import os
+import time
+import argparse
+import numpy
+from footprint import FOOTPRINT_DTYPE, frame_footprint, front_speed
+from framereader import list_frames, open_frame, read_frame_header
+from gauges import GaugeStore, parse_gauge_text, gauge_files
+from helpers import interpolate
+from reductions import VOLUME_DTYPE, frame_level_volumes
+
+
+class OutputTail:
+    """Poll an _output directory for new gauge rows and new frames.
+
+    Args / Attributes:
+    ------------------
+        output_dir: a path-like object; the _output directory of a run.
+        file_prefix: the prefix of output files.
+        offsets: a dictionary; bytes of each gauge file consumed so far.
+        headers: a dictionary; (gauge_id, x, y) of each gauge file.
+        last_frame: int; the last complete frame returned (-1 if none).
+    """
+
+    def __init__(self, output_dir, file_prefix="fort"):
+        self.output_dir = output_dir
+        self.file_prefix = file_prefix
+        self.offsets = {}
+        self.headers = {}
+        self.last_frame = -1
+
+    def _read_gauge(self, filepath):
+        """Parse the complete lines appended to a gauge file since the last poll."""
+
+        offset = self.offsets.get(filepath, 0)
+        if os.path.getsize(filepath) < offset:  # the file was rewritten, e.g., a restarted run
+            offset = 0
+            self.headers.pop(filepath, None)
+
+        with open(filepath, "rb") as fileobj:
+            fileobj.seek(offset)
+            chunk = fileobj.read()
+
+        # a line still being written stays in the file for the next poll
+        chunk = chunk[:chunk.rfind(b"\n")+1]
+        self.offsets[filepath] = offset + len(chunk)
+        gauge_id, x, y, data = parse_gauge_text(chunk.decode())
+
+        if filepath not in self.headers:
+            if gauge_id is None:  # fall back to the file name
+                gauge_id, x, y = int(os.path.basename(filepath)[5:-4]), numpy.nan, numpy.nan
+            self.headers[filepath] = (gauge_id, x, y)
+
+        return data
+
+    def poll_gauges(self):
+        """Get the gauge rows written since the last poll.
+
+        Returns:
+        --------
+            A GaugeStore holding only the new rows.
+        """
+
+        ids, xs, ys, datasets = [], [], [], []
+        for filepath in gauge_files(self.output_dir):
+            data = self._read_gauge(filepath)
+            gauge_id, x, y = self.headers[filepath]
+            ids.append(gauge_id)
+            xs.append(x)
+            ys.append(y)
+            datasets.append(data)
+
+        return GaugeStore.from_arrays(ids, xs, ys, datasets)
+
+    def _complete(self, frame):
+        """Whether all headers and solution data of a frame are on disk."""
+
+        try:
+            meta, patches = read_frame_header(self.output_dir, frame, self.file_prefix, use_sidecar=False)
+        except (FileNotFoundError, IndexError, ValueError):
+            return False
+
+        if not patches.size:
+            return True
+
+        ng = meta["num_ghost"]
+        last = patches[-1]
+        nbytes = last["offset"] + meta["num_eqn"] * (last["nx"] + 2 * ng) * (last["ny"] + 2 * ng) * 8
+        filepath = os.path.join(self.output_dir, "{}.b{:04d}".format(self.file_prefix, frame))
+        return os.path.isfile(filepath) and os.path.getsize(filepath) >= nbytes
+
+    def poll_frames(self):
+        """Get the sorted numbers of frames completed since the last poll."""
+
+        frames = []
+        for fno in list_frames(self.output_dir, self.file_prefix):
+            if fno <= self.last_frame:
+                continue
+            if not self._complete(fno):  # later frames wait for this one
+                break
+            frames.append(fno)
+            self.last_frame = fno
+
+        return frames
+
+    def poll(self):
+        """Get (GaugeStore of new gauge rows, list of new frame numbers)."""
+        return self.poll_gauges(), self.poll_frames()
+
+
+class LiveRun:
+    """Run-wide reductions updated incrementally as a simulation writes outputs.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        x, y: None, or 1D numpy.ndarray of target coordinates for the max-depth
+            envelope.
+        dry_tol: float; cells deeper than this are wet.
+        method: the interpolation engine of the envelope; see
+            helpers.interpolate.
+        center: None, or [x, y] of the rupture point for footprint statistics.
+        footprint_tol: float; the depth threshold of footprint statistics.
+
+    Attributes:
+    -----------
+        tail: the OutputTail.
+        volumes: a structured numpy.ndarray of reductions.VOLUME_DTYPE.
+        envelope: None, or a 2D numpy.ndarray of shape (y.size, x.size).
+        footprint: a structured numpy.ndarray of footprint.FOOTPRINT_DTYPE.
+        gauge_max: a dictionary; {gauge_id: max of each variable}.
+        gauge_arrival: a dictionary; {gauge_id: first time depth > dry_tol}.
+    """
+    # pylint: disable=too-many-arguments
+
+    def __init__(self, output_dir, x=None, y=None, dry_tol=1e-4, method="nearest", center=None, footprint_tol=1e-3):
+        self.tail = OutputTail(output_dir)
+        self.x, self.y = x, y
+        self.dry_tol = dry_tol
+        self.method = method
+        self.center = center
+        self.footprint_tol = footprint_tol
+
+        self.volumes = numpy.zeros(0, dtype=VOLUME_DTYPE)
+        self.envelope = None if x is None else numpy.zeros((y.size, x.size), dtype=numpy.float64)
+        self.footprint = numpy.zeros(0, dtype=FOOTPRINT_DTYPE)
+        self.gauge_max = {}
+        self.gauge_arrival = {}
+
+    def _update_gauges(self, store):
+        """Fold new gauge rows into the running maxima and arrival times."""
+
+        nonempty = numpy.diff(store.starts) > 0
+        if not numpy.any(nonempty):
+            return
+
+        ids = store.ids[nonempty]
+        maxima = numpy.stack([store.max(var, ids) for var in range(store.q.shape[1])], axis=1)
+        arrivals = store.arrival(0, self.dry_tol, ids)
+
+        for gid, vmax, arrival in zip(ids.tolist(), maxima, arrivals):
+            self.gauge_max[gid] = numpy.fmax(self.gauge_max.get(gid, vmax), vmax)
+            if numpy.isnan(self.gauge_arrival.get(gid, numpy.nan)):
+                self.gauge_arrival[gid] = arrival
+
+    def update(self):
+        """Read new outputs and update all reductions.
+
+        Returns:
+        --------
+            A list of the new frame numbers.
+        """
+
+        store, frames = self.tail.poll()
+        self._update_gauges(store)
+
+        for fno in frames:
+            self.volumes = numpy.concatenate(
+                (self.volumes, frame_level_volumes(self.tail.output_dir, fno, self.dry_tol)))
+
+            if self.envelope is not None:
+                bbox = [self.x.min(), self.y.min(), self.x.max(), self.y.max()]
+                soln = open_frame(self.tail.output_dir, fno, bbox=bbox)
+                numpy.maximum(
+                    self.envelope, interpolate(soln, 0, self.x, self.y, None, self.method), out=self.envelope)
+
+            if self.center is not None:
+                self.footprint = numpy.concatenate((
+                    self.footprint, frame_footprint(self.tail.output_dir, fno, self.center, self.footprint_tol)))
+
+        front_speed(self.footprint)
+
+        return frames
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Follow the outputs of a running GeoClaw simulation.")
+    parser.add_argument("output_dir", help="The _output directory of a run.")
+    parser.add_argument("--interval", default=30., type=float, help="Seconds between polls.")
+    parser.add_argument("--dry-tol", default=1e-4, type=float, help="Dry tolerance.")
+    parser.add_argument("--tfinal", default=None, type=float, help="Stop once a frame reaches this time.")
+    args = parser.parse_args()
+
+    live = LiveRun(os.path.abspath(os.path.expanduser(args.output_dir)), dry_tol=args.dry_tol)
+
+    while True:
+        for fno in live.update():
+            row = live.volumes[(live.volumes["frame"] == fno) & (live.volumes["level"] == 1)][0]
+            print("frame {}: t = {:.6e}, level-1 volume = {:.6e}, level-1 wet cells = {}".format(
+                fno, row["t"], row["volume"], row["nwet"]))
+
+        if args.tfinal is not None and live.volumes.size and live.volumes["t"][-1] >= args.tfinal:
+            break
+
+        time.sleep(args.interval)
+
+    for gid in sorted(live.gauge_max):
+        print("gauge {}: max depth {:.6e}, arrival time {:.6e}".format(
+            gid, live.gauge_max[gid][0], live.gauge_arrival[gid]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Tests of rasters.py on a small synthetic GeoClaw binary output.
+"""
+import numpy
+from rasters import max_envelope
+from test_reductions import write_frame
+
+
+def test_max_envelope_negative_field(tmp_path):
+    """The envelope of a negative field is not clamped at zero; points no frame covers are zero."""
+
+    for frame in range(3):
+        q = numpy.zeros((4, 4, 4))
+        q[0], q[1] = 1., -5. - frame
+        write_frame(tmp_path, frame, [(1, 0., 0., 1., 1., q)], t=float(frame))
+
+    x, y = numpy.linspace(0.5, 3.5, 4), numpy.linspace(0.5, 3.5, 4)
+    envelope = max_envelope(tmp_path, x, y, field=1, nprocs=2)
+    assert numpy.array_equal(envelope, numpy.full((4, 4), -5.))
+
+    x = numpy.append(x, 10.)  # outside the domain
+    envelope = max_envelope(tmp_path, x, y, field="hu", nprocs=1)
+    assert numpy.array_equal(envelope[:, :4], numpy.full((4, 4), -5.))
+    assert numpy.array_equal(envelope[:, 4], numpy.zeros(4))
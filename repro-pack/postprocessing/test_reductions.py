@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Tests of reductions.py on a small synthetic GeoClaw binary output.
+"""
+import numpy
+from reductions import field_stats
+
+
+def write_frame(output_dir, frame, patches, t=0., num_ghost=2):
+    """Write a frame of GeoClaw binary output.
+
+    Args:
+    -----
+        output_dir: a pathlib.Path.
+        frame: int; the frame number.
+        patches: a list of (level, xlow, ylow, dx, dy, q), where q is a 3D
+            numpy.ndarray of shape (4, nx, ny) without ghost cells.
+        t: float; the frame time.
+        num_ghost: int; the number of ghost cells.
+    """
+
+    with open(output_dir.joinpath("fort.t{:04d}".format(frame)), "w") as fileobj:
+        fileobj.write("{:18.8E}    time\n".format(t))
+        for value, name in [(4, "num_eqn"), (len(patches), "nstates"), (0, "num_aux"), (2, "num_dim")]:
+            fileobj.write("{:6d}                 {}\n".format(value, name))
+        fileobj.write("{:6d}                 num_ghost\n     binary            format\n".format(num_ghost))
+
+    blocks = []
+    with open(output_dir.joinpath("fort.q{:04d}".format(frame)), "w") as fileobj:
+        for pid, (level, xlow, ylow, dx, dy, q) in enumerate(patches):
+            fileobj.write("{:6d}                 grid_number\n{:6d}                 AMR_level\n".format(pid+1, level))
+            fileobj.write("{:6d}                 mx\n{:6d}                 my\n".format(*q.shape[1:]))
+            for value, name in [(xlow, "xlow"), (ylow, "ylow"), (dx, "dx"), (dy, "dy")]:
+                fileobj.write("{:26.16E}    {}\n".format(value, name))
+            fileobj.write("\n")
+
+            full = numpy.zeros((4, q.shape[1]+2*num_ghost, q.shape[2]+2*num_ghost))
+            full[:, num_ghost:-num_ghost, num_ghost:-num_ghost] = q
+            blocks.append(full.ravel(order="F"))
+
+    numpy.concatenate(blocks).tofile(output_dir.joinpath("fort.b{:04d}".format(frame)))
+
+
+def test_field_stats_dry_level(tmp_path):
+    """A level that stays dry in all frames has no stats and does not break percentiles."""
+
+    for frame in range(2):
+        coarse = numpy.zeros((4, 4, 4))
+        coarse[0] = numpy.arange(16.).reshape(4, 4) + frame
+        fine = numpy.zeros((4, 4, 4))  # level 2 is dry everywhere
+        write_frame(tmp_path, frame, [(1, 0., 0., 1., 1., coarse), (2, 1., 1., .5, .5, fine)], t=float(frame))
+
+    stats = field_stats(tmp_path, 0, dry_tol=1e-4, percentiles=[50], nprocs=1, cache=False)
+
+    assert set(stats) == {1, "all"}
+    assert stats[1]["count"] == stats["all"]["count"] == 31  # one coarse cell is dry in frame 0
+    assert stats["all"]["min"] == 1. and stats["all"]["max"] == 16.
+    assert abs(stats["all"]["percentiles"][0] - 8.) < 1e-2
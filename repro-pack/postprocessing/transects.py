@@ -0,0 +1,178 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Contributors: Pi-Yueh Chuang <pychuang@gwu.edu>
+#
+# Distributed under terms of the BSD 3-Clause license.
+
+"""Depth and speed profiles along polylines (e.g., a road or a ditch) over time.
+
+A polyline is densified with the spacing of the finest patch covering each part
+of it in any frame, from the frame header tables alone. All frames are then
+sampled at the densified points in one streaming pass, giving distance x time
+arrays ready for Hovmoller-style plots.
+
+Example (a transect downhill from the rupture point of the hill case):
+
+    $ python transects.py ../../landspill-runs/utah_hill_maya/_output \\
+        --polyline -12443619 4977641 -12443500 4977300 -12443400 4977000 --out hill-transect.npz
+"""
+import os
+import argparse
+import numpy
+from framereader import list_frames, read_frame_header
+from helpers import iter_frames, probe
+
+
+def run_patches(output_dir, frames=None):
+    """Get the unique patch geometries of all frames of a run.
+
+    Returns:
+    --------
+        lower, upper, delta: 2D numpy.ndarray of shape (npatches, 2).
+    """
+
+    frames = list_frames(output_dir) if frames is None else frames
+    tables = [read_frame_header(output_dir, fno)[1] for fno in frames]
+    geom = numpy.concatenate([
+        numpy.column_stack((tbl["xlow"], tbl["ylow"], tbl["nx"]*tbl["dx"], tbl["ny"]*tbl["dy"], tbl["dx"], tbl["dy"]))
+        for tbl in tables
+    ] + [numpy.zeros((0, 6))])
+    geom = numpy.unique(geom, axis=0)
+
+    return geom[:, :2], geom[:, :2] + geom[:, 2:4], geom[:, 4:]
+
+
+def _segment_spacing(p0, p1, lower, upper, delta):
+    """Get the breakpoints along a segment and the finest cell size between consecutive ones.
+
+    Returns:
+    --------
+        breaks: 1D numpy.ndarray; sorted parameters in [0, 1].
+        spacing: 1D numpy.ndarray of size breaks.size-1; inf where no patch covers.
+    """
+
+    # clip the segment against every patch box (Liang-Barsky) in one go
+    d = p1 - p0
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        t0 = (lower - p0) / d
+        t1 = (upper - p0) / d
+
+    # along an axis the segment does not move, it is either always or never within the box
+    inside = (p0 >= lower) & (p0 <= upper)
+    entry = numpy.where(d == 0., numpy.where(inside, -numpy.inf, numpy.inf), numpy.minimum(t0, t1))
+    exit_ = numpy.where(d == 0., numpy.where(inside, numpy.inf, -numpy.inf), numpy.maximum(t0, t1))
+    enter = numpy.clip(entry.max(axis=1), 0., 1.)
+    leave = numpy.clip(exit_.min(axis=1), 0., 1.)
+    hit = leave > enter
+
+    breaks = numpy.unique(numpy.concatenate(([0., 1.], enter[hit], leave[hit])))
+    mid = (breaks[:-1] + breaks[1:]) / 2.
+    covers = (enter[hit][None, :] <= mid[:, None]) & (leave[hit][None, :] >= mid[:, None])
+    sizes = delta[hit].min(axis=1)
+    spacing = numpy.where(covers, sizes[None, :], numpy.inf).min(axis=1, initial=numpy.inf)
+
+    return breaks, spacing
+
+
+def densify_polyline(vertices, lower, upper, delta):
+    """Place points along a polyline at the local finest cell size.
+
+    Args:
+    -----
+        vertices: 2D numpy.ndarray of shape (nvertices, 2).
+        lower, upper, delta: patch geometries; see run_patches.
+
+    Returns:
+    --------
+        points: 2D numpy.ndarray of shape (npoints, 2).
+        distance: 1D numpy.ndarray; the distance of each point along the
+            polyline from its first vertex.
+    """
+
+    vertices = numpy.asarray(vertices, dtype=numpy.float64)
+    coarsest = delta.max() if delta.size else numpy.inf
+    params, offsets = [], []
+    start = 0.
+
+    for p0, p1 in zip(vertices[:-1], vertices[1:]):
+        length = numpy.hypot(*(p1 - p0))
+        breaks, spacing = _segment_spacing(p0, p1, lower, upper, delta)
+
+        # parts outside all patches are still sampled (as NaN) at the coarsest spacing
+        spacing = numpy.where(numpy.isfinite(spacing), spacing, coarsest)
+        npts = numpy.maximum(numpy.ceil((breaks[1:] - breaks[:-1]) * length / spacing).astype(numpy.int64), 1)
+        seg = numpy.concatenate([b0 + (b1 - b0) * numpy.arange(n) / n for b0, b1, n in zip(breaks, breaks[1:], npts)])
+
+        params.append(p0 + seg[:, None] * (p1 - p0))
+        offsets.append(start + seg * length)
+        start += length
+
+    params.append(vertices[-1:])
+    offsets.append([start])
+
+    return numpy.concatenate(params), numpy.concatenate(offsets)
+
+
+def sample_transect(output_dir, vertices, frames=None, method="nearest", dry_tol=1e-4, prefetch=2):
+    """Sample depth and speed along a polyline in all frames of a run.
+
+    Args:
+    -----
+        output_dir: a path-like object; the _output directory of a run.
+        vertices: 2D array-like of shape (nvertices, 2); the polyline.
+        frames: an iterable of frame numbers; None means all frames.
+        method: the interpolation engine; see helpers.probe.
+        dry_tol: float; the speed is zero where the depth is below this.
+        prefetch: int; the number of frames read ahead; see helpers.iter_frames.
+
+    Returns:
+    --------
+        A dictionary of:
+            x, y, distance: 1D numpy.ndarray; the densified points.
+            t: 1D numpy.ndarray; frame times.
+            depth, speed: 2D numpy.ndarray of shape (distance.size, t.size);
+                NaN outside the domain.
+    """
+    # pylint: disable=too-many-arguments
+
+    frames = list_frames(output_dir) if frames is None else sorted(frames)
+    points, distance = densify_polyline(vertices, *run_patches(output_dir, frames))
+    bbox = [points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()]
+
+    times = numpy.zeros(len(frames))
+    values = numpy.zeros((2, distance.size, len(frames)))
+
+    for i, (_, soln) in enumerate(iter_frames(output_dir, frames, prefetch, bbox=bbox)):
+        times[i] = soln.t
+        values[:, :, i] = probe(soln, ["depth", "speed"], points[:, 0], points[:, 1], None, method, dry_tol)
+
+    return {
+        "x": points[:, 0], "y": points[:, 1], "distance": distance, "t": times,
+        "depth": values[0], "speed": values[1]
+    }
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Depth and speed profiles along a polyline over time.")
+    parser.add_argument("output_dir", help="The _output directory of a run.")
+    parser.add_argument("--polyline", required=True, type=float, nargs="+", help="x1 y1 x2 y2 ... of vertices.")
+    parser.add_argument("--method", default="nearest", help="Interpolation engine.")
+    parser.add_argument("--out", required=True, help="Output npz (x, y, distance, t, depth, speed).")
+    args = parser.parse_args()
+
+    if len(args.polyline) < 4 or len(args.polyline) % 2:
+        parser.error("--polyline needs at least two vertices of x y pairs")
+
+    result = sample_transect(
+        os.path.abspath(os.path.expanduser(args.output_dir)), numpy.reshape(args.polyline, (-1, 2)),
+        method=args.method
+    )
+    numpy.savez(args.out, **result)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,7 @@
 #
 # Distributed under terms of the BSD 3-Clause license.
 
-"""Postprocessing of Maya crude and gasoline above flat terrain in Utah.
-
-Requires the environment variable PYTHONPATH and CLAW to point to clawpack.
-"""
+"""Postprocessing of Maya crude and gasoline above flat terrain in Utah."""
 import os
 import pathlib
 import numpy
@@ -18,8 +15,7 @@ import matplotlib
 from matplotlib import image
 from matplotlib import pyplot
 from matplotlib import colors
-from clawpack import pyclaw
-from helpers import download_sat_image, interpolate, get_max_AMR_level
+from helpers import download_sat_image, interpolate, get_max_AMR_level, iter_frames
 
 # paths
 root_dir = pathlib.Path(__file__).expanduser().resolve().parents[2]
@@ -68,12 +64,14 @@ fig, axs = pyplot.subplots(4, 2, figsize=(13, 11), sharex=True, sharey=True)
 
 fig.suptitle("Maya crude oil and gasoline overland flow, flat terrain")
 
+# frames are read in background threads while the previous ones are plotted
+maya_frames = iter_frames(maya_dir.joinpath("_output"), [fno+1 for fno in idx])
+gasoline_frames = iter_frames(gasoline_dir.joinpath("_output"), [fno+1 for fno in idx])
+
 for i, (fno, t) in enumerate(zip(idx, T)):
 
-    def reused_func(ax, title, output_dir):
+    def reused_func(ax, title, soln):
         """To reduce duplicated code."""
-        aux = True if output_dir.joinpath("fort.a{:04d}".format(fno+1)).is_file() else False
-        soln = pyclaw.Solution(fno+1, path=output_dir, file_format="binary", read_aux=aux)
         maxlv = get_max_AMR_level(soln)
         vals = interpolate(soln, 0, x, y, maxlv)
         vals = numpy.ma.array(vals, mask=(vals<1e-3))
@@ -102,11 +100,11 @@ for i, (fno, t) in enumerate(zip(idx, T)):
 
     # maya crude
     csf, scatter = reused_func(
-        axs[i, 0], "Maya crude, T = {} min".format(t), maya_dir.joinpath("_output"))
+        axs[i, 0], "Maya crude, T = {} min".format(t), next(maya_frames)[1])
 
     # gasoline
     csf, scatter = reused_func(
-        axs[i, 1], "Gasoline, T = {} min".format(t), gasoline_dir.joinpath("_output"))
+        axs[i, 1], "Gasoline, T = {} min".format(t), next(gasoline_frames)[1])
 
 for i in range(3):
     pyplot.setp(axs[i, 0].get_xticklabels(), visible=False)